@@ -1,21 +1,200 @@
 import sys, json
 sys.stdout.reconfigure(encoding="utf-8")
 
+import io
+import math
 import os
+import secrets
 import tempfile
-
-from flask import Flask, render_template, request, jsonify, Response, redirect, url_for
+import time
+from contextlib import closing
+
+from flask import (
+    Flask, Request, render_template, request, jsonify, Response, redirect, url_for,
+    session, g, stream_with_context, current_app,
+)
+from markupsafe import escape
 import db
+import health
+import jobs
 import llm
+import metrics
+import scheduler
 import transcript
 
+
+class SpooledRequest(Request):
+    """Keep uploads in memory, spilling to disk only above UPLOAD_SPOOL_BYTES."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(
+            max_size=current_app.config["UPLOAD_SPOOL_BYTES"], mode="rb+"
+        )
+
+
 app = Flask(__name__)
+app.request_class = SpooledRequest
+app.wsgi_app = metrics.InstrumentedWSGI(app.wsgi_app)
 app.config["MAX_CONTENT_LENGTH"] = 10 * 1024 * 1024  # 10MB upload limit
+app.config["UPLOAD_SPOOL_BYTES"] = 1024 * 1024
+app.config["MATCH_CACHE_TTL"] = 7 * 24 * 3600  # seconds a generated match list stays reusable
+app.config["MATCH_CACHE_ENTRIES"] = 20  # per student, least recently used evicted first
+app.config["TRANSCRIPT_CACHE_TTL"] = 30 * 24 * 3600
+app.config["TRANSCRIPT_CACHE_ENTRIES"] = 20
+app.config["STREAM_FLUSH_SECONDS"] = 0.05  # batch streamed tokens into one SSE frame per window...
+app.config["STREAM_FLUSH_BYTES"] = 512  # ...or once this much text is waiting
+app.config["REPLY_CHECKPOINT_SECONDS"] = 1.0  # how often a streaming reply is saved
+
+
+def _persistent_secret_key():
+    """Session signing key, generated once and kept in the data directory.
+
+    The file is readable by its owner only; keys written by older versions
+    with the default umask are tightened when found.
+    """
+    path = os.path.join(db.DATA_DIR, "secret_key")
+    os.makedirs(db.DATA_DIR, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        try:
+            os.chmod(path, 0o600)
+        except OSError:
+            pass  # not ours to change; still usable
+    else:
+        with os.fdopen(fd, "w") as fh:
+            fh.write(secrets.token_hex(32))
+    with open(path) as fh:
+        return fh.read().strip()
+
+
+# Schema bootstrap runs once at process start; migrations are versioned in db.py.
+# In multi-student mode each student's shard is migrated lazily on first use.
+if db.MULTI_STUDENT:
+    app.secret_key = os.environ.get("COLLEGE_HUB_SECRET_KEY") or _persistent_secret_key()
+    db.init_db(db.CATALOG_PATH)
+else:
+    db.init_db()
+
+
+# ── Student routing (multi-student mode) ─────────────────────────
+
+STUDENT_EXEMPT_ENDPOINTS = {"static", "students", "students_add", "students_select", "llm_status",
+                            "metrics_export", "admin_queries", "admin_queries_reset"}
 
 
 @app.before_request
-def ensure_db():
-    db.init_db()
+def label_route():
+    """Name the request by its URL rule for metrics (bounded, unlike the raw path)."""
+    if request.url_rule is not None:
+        request.environ["college_hub.route"] = request.url_rule.rule
+
+
+@app.before_request
+def route_student_db():
+    """Point the db helpers at the selected student's shard for this request."""
+    if not db.MULTI_STUDENT:
+        return None
+    student_id = session.get("student_id")
+    student = db.get_student(student_id) if student_id is not None else None
+    if student is None:
+        if request.endpoint in STUDENT_EXEMPT_ENDPOINTS:
+            return None
+        if request.method == "GET":
+            return redirect(url_for("students"))
+        return jsonify({"error": "No student selected"}), 409
+    g.student = student
+    g.db_token = db.select_db(db.shard_path(student["id"]))
+    return None
+
+
+@app.teardown_request
+def release_student_db(exc):
+    token = g.pop("db_token", None)
+    if token is not None:
+        db.release_db(token)
+
+
+@app.errorhandler(health.Unavailable)
+@app.errorhandler(scheduler.Overloaded)
+def llm_overloaded(e):
+    """Model down or queue full: tell the client when to retry instead of making it wait."""
+    response = jsonify({"error": str(e)})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+@app.context_processor
+def inject_student():
+    return {"multi_student": db.MULTI_STUDENT, "current_student": g.get("student")}
+
+
+@app.route("/students")
+def students():
+    if not db.MULTI_STUDENT:
+        return redirect(url_for("dashboard"))
+    return render_template("students.html", students=db.get_students(),
+                           selected=session.get("student_id"))
+
+
+@app.route("/students/add", methods=["POST"])
+def students_add():
+    name = request.form.get("name", "").strip()
+    if db.MULTI_STUDENT and name:
+        session["student_id"] = db.create_student(name)
+        return redirect(url_for("dashboard"))
+    return redirect(url_for("students"))
+
+
+@app.route("/students/select/<int:student_id>", methods=["POST"])
+def students_select(student_id):
+    if db.MULTI_STUDENT and db.get_student(student_id):
+        session["student_id"] = student_id
+        return redirect(url_for("dashboard"))
+    return redirect(url_for("students"))
+
+
+def event_stream(frames):
+    """text/event-stream response that keeps the request's context while streaming.
+
+    Flask tears the request down before the body is iterated, so the
+    student's database is re-selected around the generator explicitly.
+    """
+    path = db.current_db()
+
+    def generate():
+        with db.using(path):
+            yield from frames
+    return Response(stream_with_context(generate()), mimetype="text/event-stream")
+
+
+def coalesce(tokens, window, max_bytes):
+    """Batch a token stream into chunks, at most one per time window or max_bytes.
+
+    The first token goes out immediately so time-to-first-token is unchanged.
+    """
+    buf = []
+    size = 0
+    last_flush = 0.0
+    for token in tokens:
+        buf.append(token)
+        size += len(token)
+        now = time.monotonic()
+        if size >= max_bytes or now - last_flush >= window:
+            yield "".join(buf)
+            buf, size, last_flush = [], 0, now
+    if buf:
+        yield "".join(buf)
+
+
+def student_context():
+    """LLM context for the current student, re-rendered only after data changes."""
+    return llm.student_context(
+        db.current_db(),
+        db.get_data_version(),
+        lambda: (db.get_profile(), db.get_courses(), db.get_gpa()),
+    )
 
 
 # ── Dashboard ────────────────────────────────────────────────────
@@ -31,20 +210,46 @@ def dashboard():
 @app.route("/grades")
 def grades():
     courses = db.get_courses()
-    gpa = db.calc_gpa(courses)
+    gpa = db.get_gpa()
     profile = db.get_profile()
     return render_template("grades.html", courses=courses, gpa=gpa, profile=profile)
 
 
+MIN_CREDITS = 0.5
+MAX_CREDITS = 2.0
+
+
+def course_fields(data, year="Junior"):
+    """Grade, year, course type and credits from a course form or JSON row.
+
+    Shared by every route that adds or projects courses. Raises ValueError
+    with a message for the student when a value is missing or out of range.
+    """
+    grade = data.get("grade", "")
+    if grade not in db.GRADE_POINTS:
+        raise ValueError(f"Unknown grade: {grade!r}")
+    course_type = data.get("course_type") or "Regular"
+    if course_type not in db.WEIGHT_BONUS:
+        raise ValueError(f"Unknown course type: {course_type!r}")
+    try:
+        credits = float(data.get("credits", 1.0))
+    except (ValueError, TypeError):
+        credits = None
+    if credits is None or not math.isfinite(credits) or not MIN_CREDITS <= credits <= MAX_CREDITS:
+        raise ValueError(f"Credits must be between {MIN_CREDITS} and {MAX_CREDITS}")
+    return {"grade": grade, "year": data.get("year") or year, "course_type": course_type, "credits": credits}
+
+
 @app.route("/grades/add", methods=["POST"])
 def grades_add():
-    db.add_course(
-        name=request.form["name"],
-        grade=request.form["grade"],
-        year=request.form["year"],
-        course_type=request.form.get("course_type", "Regular"),
-        credits=float(request.form.get("credits", 1.0)),
-    )
+    name = request.form.get("name", "").strip()
+    if not name:
+        return jsonify({"error": "Course name is required"}), 400
+    try:
+        fields = course_fields(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    db.add_course(name=name, **fields)
     return redirect(url_for("grades"))
 
 
@@ -54,6 +259,20 @@ def grades_delete(course_id):
     return redirect(url_for("grades"))
 
 
+@app.route("/grades/what-if", methods=["POST"])
+def grades_what_if():
+    """Project the GPA for hypothetical future courses on top of the current ones."""
+    data = request.get_json(silent=True) or {}
+    courses = data.get("courses", []) if isinstance(data, dict) else None
+    if not isinstance(courses, list) or not all(isinstance(c, dict) for c in courses):
+        return jsonify({"error": "Expected a list of courses"}), 400
+    try:
+        hypothetical = [course_fields(c, year="Senior") for c in courses]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(db.project_gpa(hypothetical))
+
+
 @app.route("/grades/scores", methods=["POST"])
 def grades_scores():
     sat = request.form.get("sat_score")
@@ -70,7 +289,7 @@ def grades_scores():
 
 @app.route("/grades/upload", methods=["POST"])
 def grades_upload():
-    """Upload a transcript file, extract text, and parse courses via Ollama."""
+    """Upload a transcript and start a background job that extracts and parses its courses."""
     if "file" not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
 
@@ -82,53 +301,108 @@ def grades_upload():
     if ext not in ("pdf", "docx"):
         return jsonify({"error": "Only PDF and DOCX files are supported"}), 400
 
-    if not llm.check_available():
-        return jsonify({"error": "Ollama is not running. Please start Ollama and try again."}), 503
+    # Parsing can take a while, so it runs as a background job and the client
+    # follows it at /jobs/<id>/events. The job takes ownership of the spooled
+    # upload, which the request would otherwise close when it ends.
+    scheduler.check("parse")
+    stream, f.stream = f.stream, io.BytesIO()
+    try:
+        job_id = jobs.submit("transcript_parse", parse_transcript_job, stream, f.filename)
+    except scheduler.Overloaded:
+        stream.close()
+        raise
+    return jsonify({"job_id": job_id}), 202
+
 
-    # Save to temp file, extract, parse, then clean up
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=f".{ext}")
+def parse_transcript_job(job, stream, filename):
     try:
-        f.save(tmp)
-        tmp.close()
-        raw_text = transcript.extract_text(tmp.name, f.filename)
-        if not raw_text.strip():
-            return jsonify({"error": "Could not extract any text from the file"}), 400
-        courses = transcript.parse_transcript(raw_text)
-        if not courses:
-            return jsonify({"error": "No courses found in the transcript"}), 400
-        return jsonify({"courses": courses})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        for event in transcript_events(stream, filename):
+            job.check_cancelled()
+            if event["event"] == "error":
+                raise RuntimeError(event["error"])
+            if event["event"] == "done":
+                return {"courses": event["courses"], "failed_chunks": event["failed_chunks"]}
+            job.progress(event)
     finally:
-        try:
-            os.unlink(tmp.name)
-        except OSError:
-            pass
+        stream.close()
+    raise RuntimeError("No courses found in the transcript")
+
+
+def transcript_events(stream, filename):
+    """Extract and parse an uploaded transcript page by page, yielding progress events.
+
+    Ends with {"event": "done", "courses": [...], "failed_chunks": n} or
+    {"event": "error", ...}. Re-uploads of the same file skip extraction, and
+    re-parses of the same text skip the model, via caches keyed by content
+    hashes. Results with failed chunks are incomplete and are not cached.
+    """
+    digest = transcript.file_digest(stream)
+    raw_text = db.cache_get("transcript_text", digest, ttl=app.config["TRANSCRIPT_CACHE_TTL"])
+    if raw_text is not None:
+        courses = db.cache_get("transcript_courses", transcript.parse_cache_key(raw_text),
+                               ttl=app.config["TRANSCRIPT_CACHE_TTL"])
+        if courses:
+            yield {"event": "done", "cached": True, "courses": courses, "failed_chunks": 0}
+            return
+        pages = raw_text.split(transcript.PAGE_BREAK)
+    else:
+        pages = []
+
+    def extracted_pages():
+        for page_text in transcript.iter_pages(stream, filename):
+            pages.append(page_text)
+            yield page_text
+
+    # Most rows are read by the rule-based parser; Ollama is only needed
+    # for lines it can't handle.
+    try:
+        for event in transcript.iter_parse(pages if raw_text is not None else extracted_pages()):
+            if event["event"] == "done":
+                break
+            yield event
+    except ConnectionError:
+        yield {"event": "error", "status": 503,
+               "error": "Ollama is not running. Please start Ollama and try again."}
+        return
+    except Exception as e:
+        yield {"event": "error", "status": 500, "error": str(e)}
+        return
+
+    if raw_text is None:
+        raw_text = transcript.PAGE_BREAK.join(pages)
+        db.cache_put("transcript_text", digest, raw_text,
+                     max_entries=app.config["TRANSCRIPT_CACHE_ENTRIES"])
+    if not raw_text.strip():
+        yield {"event": "error", "status": 400, "error": "Could not extract any text from the file"}
+        return
+    if not event["failed_chunks"]:
+        db.cache_put("transcript_courses", transcript.parse_cache_key(raw_text), event["courses"],
+                     max_entries=app.config["TRANSCRIPT_CACHE_ENTRIES"])
+    if not event["courses"]:
+        yield {"event": "error", "status": 400, "error": "No courses found in the transcript"}
+        return
+    yield event
 
 
 @app.route("/grades/import", methods=["POST"])
 def grades_import():
     """Bulk-import courses from the parsed transcript review."""
-    data = request.get_json()
-    courses = data.get("courses", [])
+    data = request.get_json(silent=True) or {}
+    courses = data.get("courses", []) if isinstance(data, dict) else None
+    if not isinstance(courses, list) or not all(isinstance(c, dict) for c in courses):
+        return jsonify({"error": "Expected a list of courses"}), 400
     if not courses:
         return jsonify({"error": "No courses to import"}), 400
 
-    count = 0
-    for c in courses:
-        name = c.get("name", "").strip()
-        grade = c.get("grade", "")
-        year = c.get("year", "Junior")
-        course_type = c.get("course_type", "Regular")
+    rows = []
+    for i, c in enumerate(courses, 1):
         try:
-            credits = float(c.get("credits", 1.0))
-        except (ValueError, TypeError):
-            credits = 1.0
-        if name and grade:
-            db.add_course(name=name, grade=grade, year=year, course_type=course_type, credits=credits)
-            count += 1
+            rows.append({"name": str(c.get("name") or ""), **course_fields(c)})
+        except ValueError as e:
+            return jsonify({"error": f"Row {i}: {e}"}), 400
 
-    return jsonify({"ok": True, "count": count})
+    result = db.import_courses(rows)
+    return jsonify({"ok": True, "count": result["inserted"] + result["updated"], **result})
 
 
 # ── Profile ──────────────────────────────────────────────────────
@@ -171,10 +445,33 @@ def chat_new():
     return jsonify({"id": cid})
 
 
+MESSAGE_PAGE_SIZE = 30
+
+
 @app.route("/chat/<int:conversation_id>/messages")
 def chat_messages(conversation_id):
-    msgs = db.get_messages(conversation_id)
-    return jsonify(msgs)
+    """One page of messages, newest first; ?before=<id> fetches the page before that message."""
+    before = request.args.get("before", type=int)
+    limit = min(max(request.args.get("limit", MESSAGE_PAGE_SIZE, type=int), 1), 100)
+    msgs, has_more = db.get_messages_page(conversation_id, before, limit)
+    return jsonify({"messages": msgs, "has_more": has_more})
+
+
+def _highlight(text):
+    """Escape a search snippet and turn its match marks into <mark> tags."""
+    return str(escape(text)).replace(db.HIGHLIGHT_START, "<mark>").replace(db.HIGHLIGHT_END, "</mark>")
+
+
+@app.route("/chat/search")
+def chat_search():
+    """Ranked full-text matches across conversation titles and messages."""
+    results = db.search_conversations(request.args.get("q", ""))
+    for t in results["titles"]:
+        t["title"] = _highlight(t["title"])
+    for m in results["messages"]:
+        m["snippet"] = _highlight(m["snippet"])
+        m["title"] = str(escape(m["title"]))
+    return jsonify(results)
 
 
 @app.route("/chat/<int:conversation_id>/send", methods=["POST"])
@@ -184,38 +481,109 @@ def chat_send(conversation_id):
     if not user_msg:
         return jsonify({"error": "Empty message"}), 400
 
-    db.add_message(conversation_id, "user", user_msg)
-
-    # Build context
-    profile = db.get_profile()
-    courses = db.get_courses()
-    gpa = db.calc_gpa(courses)
-    history = db.get_messages(conversation_id)
+    health.check()
+    scheduler.check("chat")
+    turn = begin_turn(conversation_id, user_msg)
+    chunks = coalesce(llm.stream_chat(turn["context"], turn["history"], turn["summary"]),
+                      app.config["STREAM_FLUSH_SECONDS"], app.config["STREAM_FLUSH_BYTES"])
 
     def generate():
         full_response = []
+        complete = False
+        last_checkpoint = time.monotonic()
         try:
-            for chunk in llm.stream_chat(profile, courses, gpa, history):
+            for chunk in chunks:
                 full_response.append(chunk)
                 yield f"data: {json.dumps({'token': chunk})}\n\n"
+                if time.monotonic() - last_checkpoint >= app.config["REPLY_CHECKPOINT_SECONDS"]:
+                    db.update_message(turn["reply_id"], "".join(full_response), complete=False)
+                    last_checkpoint = time.monotonic()
+            complete = True
         except Exception as e:
             error_msg = str(e)
             yield f"data: {json.dumps({'error': error_msg})}\n\n"
             full_response.append(f"\n\n[Error: {error_msg}]")
+            complete = True
+        finally:
+            # Also runs when the client goes away mid-reply.
+            content = "".join(full_response)
+            db.update_message(turn["reply_id"], content, complete)
+
+        title = end_turn(turn, content)
+        if title:
+            yield f"data: {json.dumps({'title': title})}\n\n"
+        yield "data: [DONE]\n\n"
 
-        # Save assistant message
-        db.add_message(conversation_id, "assistant", "".join(full_response))
+    return event_stream(generate())
 
-        # Auto-title on first exchange
-        msgs = db.get_messages(conversation_id)
-        if len(msgs) <= 2:
-            title = user_msg[:50] + ("..." if len(user_msg) > 50 else "")
-            db.update_conversation_title(conversation_id, title)
-            yield f"data: {json.dumps({'title': title})}\n\n"
 
-        yield "data: [DONE]\n\n"
+def begin_turn(conversation_id, user_msg):
+    """Save the student's message and set up the reply to it.
 
-    return Response(generate(), mimetype="text/event-stream")
+    Returns the turn: the LLM inputs (context, history, summary) and the id of
+    the assistant message to stream into. The reply is saved as it streams,
+    so a disconnect or crash leaves the partial text behind (complete = 0)
+    rather than losing it. Shared with the asyncio server (asgi.py).
+    """
+    db.add_message(conversation_id, "user", user_msg)
+    context = student_context()
+    convo = db.get_conversation(conversation_id)
+    # Only messages not yet folded into the summary (a few turns at most);
+    # anything that doesn't fit the budget is left for summarize_history_job.
+    recent = db.get_messages(conversation_id, convo["summary_upto"])
+    _, history = llm.fit_history(recent, convo["summary"])
+    reply_id = db.add_message(conversation_id, "assistant", "", complete=False)
+    return {
+        "conversation_id": conversation_id,
+        "user_msg": user_msg,
+        "context": context,
+        "history": history,
+        "summary": convo["summary"],
+        "first": convo["message_count"] == 1,
+        "recent": recent,
+        "reply_id": reply_id,
+    }
+
+
+def end_turn(turn, content):
+    """Bookkeeping once the reply is saved; returns the new title on a first exchange."""
+    conversation_id = turn["conversation_id"]
+
+    # Fold turns that won't fit next time into the summary while the
+    # student reads and types, rather than on their next send.
+    msgs = turn["recent"] + [{"id": turn["reply_id"], "role": "assistant", "content": content}]
+    older, _ = llm.fit_history(msgs, turn["summary"], turns=llm.HISTORY_TURNS - 1)
+    # One summary job per conversation at a time; nobody reads their results,
+    # so finished ones are cleared out rather than left in the jobs table.
+    kind = f"chat_summary:{conversation_id}"
+    if older and not jobs.active(kind):
+        jobs.forget("chat_summary:%")
+        try:
+            jobs.submit(kind, summarize_history_job, conversation_id)
+        except scheduler.Overloaded:
+            pass  # the next turn tries again; the reply is already saved
+
+    # Auto-title on first exchange
+    if turn["first"]:
+        user_msg = turn["user_msg"]
+        title = user_msg[:50] + ("..." if len(user_msg) > 50 else "")
+        db.update_conversation_title(conversation_id, title)
+        return title
+    return None
+
+
+def summarize_history_job(job, conversation_id):
+    convo = db.get_conversation(conversation_id)
+    if convo is None:
+        return {"folded": 0}
+    # Leave room for the next exchange, which the following send adds.
+    older, _ = llm.fit_history(db.get_messages(conversation_id, convo["summary_upto"]),
+                               convo["summary"], turns=llm.HISTORY_TURNS - 1)
+    if not older:
+        return {"folded": 0}
+    summary = llm.summarize_history(convo["summary"], older)
+    db.update_conversation_summary(conversation_id, summary, older[-1]["id"])
+    return {"folded": len(older)}
 
 
 @app.route("/chat/<int:conversation_id>/delete", methods=["POST"])
@@ -237,9 +605,9 @@ def colleges():
 
 @app.route("/colleges/generate", methods=["POST"])
 def colleges_generate():
-    profile = db.get_profile()
-    courses = db.get_courses()
-    gpa = db.calc_gpa(courses)
+    data = request.get_json(silent=True) or {}
+    force = bool(data.get("force"))
+    context = student_context()
 
     # Gather chat insights
     convos = db.get_conversations()
@@ -251,12 +619,51 @@ def colleges_generate():
                 chat_insights += m["content"] + "\n"
     chat_insights = chat_insights[:3000]
 
+    # Identical inputs produce an identical prompt, so reuse the last result.
+    cache_key = llm.match_cache_key(context, chat_insights)
+    if not force:
+        matches = db.cache_get("college_matches", cache_key, ttl=app.config["MATCH_CACHE_TTL"])
+        if matches is not None:
+            db.save_college_matches(matches)
+            return jsonify({"ok": True, "count": len(matches), "cached": True})
+
+    # Generation takes tens of seconds on CPU, so it runs as a background job.
+    health.check()
+    scheduler.check("match")
+    job_id = jobs.active("college_matches") or jobs.submit(
+        "college_matches", generate_matches_job, context, chat_insights, cache_key
+    )
+    return jsonify({"ok": True, "job_id": job_id}), 202
+
+
+def generate_matches_job(job, context, chat_insights, cache_key):
+    """Stream matches to subscribers as each college arrives.
+
+    If generation breaks off partway, the colleges found so far are kept
+    (but not cached), and the result says so.
+    """
+    job.progress({"event": "generating"})
+    matches = []
     try:
-        matches = llm.generate_college_matches(profile, courses, gpa, chat_insights)
-        db.save_college_matches(matches)
-        return jsonify({"ok": True, "count": len(matches)})
+        with closing(llm.stream_college_matches(context, chat_insights)) as stream:
+            for match in stream:
+                job.check_cancelled()
+                matches.append(match)
+                job.progress({"event": "college", "colleges": list(matches)})
+    except jobs.Cancelled:
+        raise
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        if not matches:
+            raise
+        db.save_college_matches(matches)
+        return {"count": len(matches), "partial": True, "error": str(e) or e.__class__.__name__}
+    if not matches:
+        raise RuntimeError("The model didn't return any colleges. Please try again.")
+    job.check_cancelled()
+    db.save_college_matches(matches)
+    db.cache_put("college_matches", cache_key, matches,
+                 max_entries=app.config["MATCH_CACHE_ENTRIES"])
+    return {"count": len(matches)}
 
 
 @app.route("/colleges/clear", methods=["POST"])
@@ -291,39 +698,130 @@ def tracker_add():
     return redirect(url_for("tracker"))
 
 
+APPLICATION_FIELDS = {
+    "status", "deadline", "app_type", "essay_status",
+    "lor_count", "transcript_sent", "test_scores_sent",
+    "financial_aid", "notes", "college_name",
+}
+APPLICATION_INT_FIELDS = {"lor_count", "transcript_sent", "test_scores_sent", "financial_aid"}
+
+
+def application_updates(data):
+    """The editable fields in data, with int fields converted (ValueError if they aren't ints)."""
+    updates = {k: v for k, v in data.items() if k in APPLICATION_FIELDS}
+    for field in APPLICATION_INT_FIELDS & updates.keys():
+        updates[field] = int(updates[field])
+    return updates
+
+
 @app.route("/tracker/update/<int:app_id>", methods=["POST"])
 def tracker_update(app_id):
-    data = request.get_json()
-    allowed = [
-        "status", "deadline", "app_type", "essay_status",
-        "lor_count", "transcript_sent", "test_scores_sent",
-        "financial_aid", "notes", "college_name",
-    ]
-    updates = {k: v for k, v in data.items() if k in allowed}
-    # Convert int fields
-    for int_field in ["lor_count", "transcript_sent", "test_scores_sent", "financial_aid"]:
-        if int_field in updates:
-            updates[int_field] = int(updates[int_field])
+    updates = application_updates(request.get_json())
     if updates:
         db.update_application(app_id, **updates)
     return jsonify({"ok": True})
 
 
+@app.route("/tracker/applications", methods=["PATCH"])
+def tracker_update_many():
+    """Apply field changes to many applications in one transaction.
+
+    Body: {"updates": [{"id": 3, "status": "Submitted", ...}, ...]}. Each
+    item succeeds or fails on its own; results come back in the same order.
+    """
+    items = (request.get_json(silent=True) or {}).get("updates")
+    if not isinstance(items, list):
+        return jsonify({"error": "Expected a list of updates"}), 400
+
+    results = [None] * len(items)
+    changes = []
+    for i, item in enumerate(items):
+        app_id = item.get("id") if isinstance(item, dict) else None
+        if not isinstance(app_id, int):
+            results[i] = {"id": app_id, "ok": False, "error": "Missing application id"}
+            continue
+        try:
+            updates = application_updates(item)
+        except (TypeError, ValueError):
+            results[i] = {"id": app_id, "ok": False, "error": "Invalid number"}
+            continue
+        changes.append((i, app_id, updates))
+
+    outcomes = db.update_applications([(app_id, updates) for _, app_id, updates in changes])
+    for (i, app_id, _), error in zip(changes, outcomes):
+        results[i] = {"id": app_id, "ok": error is None, **({"error": error} if error else {})}
+    return jsonify({"results": results})
+
+
 @app.route("/tracker/delete/<int:app_id>", methods=["POST"])
 def tracker_delete(app_id):
     db.delete_application(app_id)
     return jsonify({"ok": True})
 
 
+# ── Background jobs ──────────────────────────────────────────────
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-sent progress events for a job, ending with its final status."""
+    if jobs.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate():
+        for event in jobs.iter_events(job_id):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"data: {json.dumps(event)}\n\n"
+    return event_stream(generate())
+
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def job_cancel(job_id):
+    return jsonify({"ok": jobs.cancel(job_id)})
+
+
 # ── LLM status ───────────────────────────────────────────────────
 
 @app.route("/api/llm-status")
 def llm_status():
-    available = llm.check_available()
-    return jsonify({"available": available})
+    return jsonify({**health.status(), "scheduler": scheduler.stats()})
+
+
+# ── Metrics ──────────────────────────────────────────────────────
+
+@app.route("/metrics")
+def metrics_export():
+    """Request, database and model-call timings in Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ── Query tracing ────────────────────────────────────────────────
+
+@app.route("/admin/queries")
+def admin_queries():
+    """SQL statements traced by db.py (COLLEGE_HUB_SQL_TRACE=1), most total time first."""
+    return jsonify({
+        "enabled": db.SQL_TRACE,
+        "slow_query_ms": db.SLOW_QUERY_MS,
+        "queries": db.query_stats(),
+    })
+
+
+@app.route("/admin/queries/reset", methods=["POST"])
+def admin_queries_reset():
+    db.reset_query_stats()
+    return jsonify({"ok": True})
 
 
 if __name__ == "__main__":
-    db.init_db()
     print("College Application Hub running at http://localhost:5000")
     app.run(debug=True, port=5000)
@@ -0,0 +1,278 @@
+"""Asyncio serving mode.
+
+    uvicorn asgi:app
+
+Chat replies (/chat/<id>/send) and job progress streams (/jobs/<id>/events)
+are served natively on asyncio: a stream waiting on Ollama is a coroutine
+on the async client rather than a worker thread blocked on a socket, so
+hundreds of concurrent streams stay cheap. Every other route goes to the
+Flask app unchanged, run in a thread pool by a2wsgi's WSGIMiddleware.
+
+Database work is short and stays synchronous; it runs via asyncio.to_thread
+so it never stalls the event loop.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from http.cookies import SimpleCookie
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+
+import db
+import health
+import jobs
+import llm
+import metrics
+import scheduler
+from app import app as flask_app, begin_turn, end_turn
+
+WSGI_WORKERS = int(os.environ.get("COLLEGE_HUB_WSGI_WORKERS", "16"))
+
+wsgi_app = WSGIMiddleware(flask_app, workers=WSGI_WORKERS)
+
+CHAT_SEND = re.compile(r"^/chat/(\d+)/send$")
+JOB_EVENTS = re.compile(r"^/jobs/([0-9a-f]+)/events$")
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] == "http":
+        path, method = scope["path"], scope["method"]
+        if method == "POST" and (m := CHAT_SEND.match(path)):
+            await timed("/chat/<int:conversation_id>/send", chat_send, scope, receive, send, int(m.group(1)))
+            return
+        if method == "GET" and (m := JOB_EVENTS.match(path)):
+            await timed("/jobs/<job_id>/events", job_events, scope, receive, send, m.group(1))
+            return
+    await wsgi_app(scope, receive, send)
+
+
+async def timed(route, handler, scope, receive, send, *args):
+    """Record a native route in the same request metrics as the Flask ones."""
+    start = time.perf_counter()
+    acc = metrics.begin_request()  # asyncio.to_thread copies the context, so DB time lands here
+    status = [500]
+
+    async def capture(message):
+        if message["type"] == "http.response.start":
+            status[0] = message["status"]
+        await send(message)
+
+    try:
+        await handler(scope, receive, capture, *args)
+    finally:
+        metrics.observe_request(scope["method"], route, status[0], time.perf_counter() - start, acc[0])
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            db.close_all()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+# ── Plumbing ─────────────────────────────────────────────────────
+
+async def send_json(send, status, data, headers=()):
+    body = json.dumps(data).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode()), *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def start_event_stream(send):
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                            (b"cache-control", b"no-cache")]})
+
+
+async def send_frame(send, frame):
+    await send({"type": "http.response.body", "body": frame.encode("utf-8"), "more_body": True})
+
+
+async def read_body(receive, limit):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if len(body) > limit:
+            raise ValueError("Request body too large")
+        if not message.get("more_body"):
+            return bytes(body)
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def _session(scope):
+    """The Flask session, decoded from the cookie the same way Flask does."""
+    cookies = SimpleCookie()
+    for name, value in scope["headers"]:
+        if name == b"cookie":
+            cookies.load(value.decode("latin-1"))
+    morsel = cookies.get(flask_app.config["SESSION_COOKIE_NAME"])
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if morsel is None or serializer is None:
+        return {}
+    try:
+        return serializer.loads(morsel.value, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+async def select_student(scope):
+    """Route db helpers to the student's shard, like app.route_student_db.
+
+    Returns a token for db.release_db (None in single-student mode), or
+    False if no student is selected.
+    """
+    if not db.MULTI_STUDENT:
+        return None
+    student_id = _session(scope).get("student_id")
+    student = await asyncio.to_thread(db.get_student, student_id) if student_id is not None else None
+    if student is None:
+        return False
+    return db.select_db(db.shard_path(student["id"]))
+
+
+async def coalesce(tokens, window, max_bytes):
+    """Async counterpart of app.coalesce."""
+    buf = []
+    size = 0
+    last_flush = 0.0
+    async for token in tokens:
+        buf.append(token)
+        size += len(token)
+        now = time.monotonic()
+        if size >= max_bytes or now - last_flush >= window:
+            yield "".join(buf)
+            buf, size, last_flush = [], 0, now
+    if buf:
+        yield "".join(buf)
+
+
+async def stream_until_disconnect(receive, coro):
+    """Run coro, cancelling it if the client goes away first."""
+    task = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+# ── Routes ───────────────────────────────────────────────────────
+
+async def chat_send(scope, receive, send, conversation_id):
+    """Async version of app.chat_send; same request and SSE frames."""
+    token = await select_student(scope)
+    if token is False:
+        await send_json(send, 409, {"error": "No student selected"})
+        return
+    try:
+        try:
+            body = await read_body(receive, flask_app.config["MAX_CONTENT_LENGTH"])
+        except ValueError as e:
+            await send_json(send, 413, {"error": str(e)})
+            return
+        if body is None:
+            return
+        try:
+            user_msg = (json.loads(body or b"{}").get("message") or "").strip()
+        except (ValueError, AttributeError):
+            user_msg = ""
+        if not user_msg:
+            await send_json(send, 400, {"error": "Empty message"})
+            return
+
+        try:
+            health.check()
+            scheduler.check("chat")
+        except (health.Unavailable, scheduler.Overloaded) as e:
+            await send_json(send, 503, {"error": str(e)}, [(b"retry-after", str(e.retry_after).encode())])
+            return
+
+        turn = await asyncio.to_thread(begin_turn, conversation_id, user_msg)
+        await start_event_stream(send)
+        await stream_until_disconnect(receive, _stream_reply(send, turn))
+    finally:
+        if token is not None:
+            db.release_db(token)
+
+
+async def _stream_reply(send, turn):
+    config = flask_app.config
+    chunks = coalesce(llm.astream_chat(turn["context"], turn["history"], turn["summary"]),
+                      config["STREAM_FLUSH_SECONDS"], config["STREAM_FLUSH_BYTES"])
+    full_response = []
+    complete = False
+    last_checkpoint = time.monotonic()
+    try:
+        async for chunk in chunks:
+            full_response.append(chunk)
+            await send_frame(send, f"data: {json.dumps({'token': chunk})}\n\n")
+            if time.monotonic() - last_checkpoint >= config["REPLY_CHECKPOINT_SECONDS"]:
+                await asyncio.to_thread(db.update_message, turn["reply_id"], "".join(full_response), False)
+                last_checkpoint = time.monotonic()
+        complete = True
+    except Exception as e:
+        error_msg = str(e)
+        await send_frame(send, f"data: {json.dumps({'error': error_msg})}\n\n")
+        full_response.append(f"\n\n[Error: {error_msg}]")
+        complete = True
+    finally:
+        # Also runs when the client goes away mid-reply (the task is cancelled).
+        content = "".join(full_response)
+        await asyncio.to_thread(db.update_message, turn["reply_id"], content, complete)
+
+    title = await asyncio.to_thread(end_turn, turn, content)
+    if title:
+        await send_frame(send, f"data: {json.dumps({'title': title})}\n\n")
+    await send_frame(send, "data: [DONE]\n\n")
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def job_events(scope, receive, send, job_id):
+    """Async version of app.job_events."""
+    token = await select_student(scope)
+    if token is False:
+        await send_json(send, 409, {"error": "No student selected"})
+        return
+    try:
+        if await asyncio.to_thread(jobs.get, job_id) is None:
+            await send_json(send, 404, {"error": "Job not found"})
+            return
+        await start_event_stream(send)
+        await stream_until_disconnect(receive, _stream_job(send, job_id))
+    finally:
+        if token is not None:
+            db.release_db(token)
+
+
+async def _stream_job(send, job_id):
+    async for event in jobs.aiter_events(job_id):
+        if event is None:
+            await send_frame(send, ": keep-alive\n\n")
+        else:
+            await send_frame(send, f"data: {json.dumps(event)}\n\n")
+    await send({"type": "http.response.body", "body": b""})
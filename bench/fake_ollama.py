@@ -0,0 +1,269 @@
+"""Stand-in Ollama server for benchmarks.
+
+    python bench/fake_ollama.py --port 11500 --token-rate 40 --latency 0.3
+
+Serves /api/chat (streamed and not), /api/tags and /api/version like
+Ollama does, so the app runs unchanged with OLLAMA_HOST pointed here. Replies
+are canned per prompt type (chat, summary, transcript parse, college
+matches) and paced: --latency seconds before the first token, then
+--token-rate tokens per second.
+
+--record FILE forwards every chat to a real Ollama (--upstream) and saves
+the replies; --replay FILE serves saved replies at their recorded speed,
+falling back to the canned ones for prompts that were never recorded.
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+MODEL = "llama3.1:8b"
+
+CHAT_REPLY = (
+    "That's a great question to think through. Colleges look at the whole picture: your course "
+    "rigor, how your grades trend over time, and what you do outside class. Based on what you've "
+    "told me so far, it sounds like you enjoy hands-on work and want a campus where research is "
+    "open to undergraduates. What kind of setting do you picture yourself in, a big city or a "
+    "smaller college town? And how important is staying close to home?"
+)
+
+SUMMARY_REPLY = (
+    "- Interested in engineering and environmental science\n"
+    "- Prefers a medium-sized school in a college town\n"
+    "- Budget matters; wants strong financial aid\n"
+    "- Still deciding whether to apply early decision"
+)
+
+COLLEGES = [
+    ("Stanford University", "reach", "Stanford, CA", "Large"),
+    ("Massachusetts Institute of Technology", "reach", "Cambridge, MA", "Medium"),
+    ("Carnegie Mellon University", "reach", "Pittsburgh, PA", "Medium"),
+    ("Rice University", "reach", "Houston, TX", "Small"),
+    ("University of Michigan", "match", "Ann Arbor, MI", "Large"),
+    ("University of Wisconsin-Madison", "match", "Madison, WI", "Large"),
+    ("Case Western Reserve University", "match", "Cleveland, OH", "Medium"),
+    ("Rensselaer Polytechnic Institute", "match", "Troy, NY", "Medium"),
+    ("Purdue University", "match", "West Lafayette, IN", "Large"),
+    ("University of Minnesota", "safety", "Minneapolis, MN", "Large"),
+    ("Iowa State University", "safety", "Ames, IA", "Large"),
+    ("Michigan Technological University", "safety", "Houghton, MI", "Small"),
+    ("University of Vermont", "safety", "Burlington, VT", "Medium"),
+]
+
+
+def _matches_reply():
+    return json.dumps({"colleges": [
+        {"name": name, "tier": tier, "reasoning": "Strong programs in the student's areas of interest "
+                                                  "and a good fit for their profile.",
+         "fit_score": 90 - 3 * i, "location": location, "size": size}
+        for i, (name, tier, location, size) in enumerate(COLLEGES)
+    ]}, indent=2)
+
+
+def _parse_reply(messages):
+    """A course for each leftover line the app sent, so replies scale with the input."""
+    text = messages[-1]["content"] if messages else ""
+    courses = []
+    for line in text.splitlines():
+        m = re.search(r"\b([A-DF][+-]?)\b", line)
+        name = line.split("-")[0].strip()
+        if m and re.search(r"[A-Za-z]{3}", name):
+            courses.append({"name": name[:60], "grade": m.group(1), "year": "Junior",
+                            "course_type": "Regular", "credits": 1.0})
+    return json.dumps(courses)
+
+
+def canned_reply(messages):
+    system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+    if "college admissions expert" in system:
+        return _matches_reply()
+    if "transcript parser" in system:
+        return _parse_reply(messages)
+    if "running notes" in system:
+        return SUMMARY_REPLY
+    return CHAT_REPLY
+
+
+def tokenize(text):
+    """Split text into word-sized pieces, roughly as a tokenizer would."""
+    return re.findall(r"\s*\S+", text) or [""]
+
+
+def request_key(body):
+    payload = json.dumps([body.get("model"), body.get("messages"), body.get("format")], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Recording:
+    """Replies keyed by request_key(), stored one JSON object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self.replies = {}
+        self.lock = threading.Lock()
+        try:
+            with open(path) as fh:
+                for line in fh:
+                    entry = json.loads(line)
+                    self.replies[entry["key"]] = entry
+        except FileNotFoundError:
+            pass
+
+    def add(self, entry):
+        with self.lock:
+            self.replies[entry["key"]] = entry
+            with open(self.path, "a") as fh:
+                fh.write(json.dumps(entry) + "\n")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "fake-ollama"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._json({"models": [{"name": MODEL, "model": MODEL, "size": 0, "digest": "fake"}]})
+        elif self.path == "/api/version":
+            self._json({"version": "0.0.0-fake"})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if self.path != "/api/chat":
+            self._json({"error": "not found"}, 404)
+            return
+        reply = self.server.reply_for(body)
+        if body.get("stream", True):
+            self._stream(body, reply)
+        else:
+            time.sleep(reply["latency"] + reply["eval_count"] / reply["rate"])
+            self._json(self._final(body, reply, content=reply["content"]))
+
+    def _final(self, body, reply, content=""):
+        return {
+            "model": body.get("model", MODEL),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((reply["latency"] + reply["eval_count"] / reply["rate"]) * 1e9),
+            "prompt_eval_count": reply["prompt_eval_count"],
+            "prompt_eval_duration": int(reply["latency"] * 1e9),
+            "eval_count": reply["eval_count"],
+            "eval_duration": int(reply["eval_count"] / reply["rate"] * 1e9),
+        }
+
+    def _chunk(self, data):
+        line = json.dumps(data).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, body, reply):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            time.sleep(reply["latency"])
+            interval = 1.0 / reply["rate"]
+            next_at = time.monotonic()
+            for token in tokenize(reply["content"]):
+                next_at += interval
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self._chunk({"model": body.get("model", MODEL),
+                             "created_at": datetime.now(timezone.utc).isoformat(),
+                             "message": {"role": "assistant", "content": token}, "done": False})
+            self._chunk(self._final(body, reply))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the app cancelled the reply
+
+
+class FakeOllama(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, token_rate, latency, record=None, replay=None, upstream=None):
+        super().__init__(address, Handler)
+        self.token_rate = token_rate
+        self.latency = latency
+        self.record = Recording(record) if record else None
+        self.replay = Recording(replay) if replay else None
+        self.upstream = upstream
+        self.replay_misses = 0
+
+    def reply_for(self, body):
+        messages = body.get("messages") or []
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4 + 1
+        key = request_key(body)
+        if self.record is not None:
+            return self._record(key, body)
+        if self.replay is not None:
+            entry = self.replay.replies.get(key)
+            if entry is not None:
+                return {**entry, "rate": self.token_rate or entry["rate"],
+                        "latency": entry["latency"] if self.latency is None else self.latency}
+            self.replay_misses += 1
+        content = canned_reply(messages)
+        return {"content": content, "prompt_eval_count": prompt_tokens,
+                "eval_count": len(tokenize(content)), "rate": self.token_rate or 40.0,
+                "latency": 0.2 if self.latency is None else self.latency}
+
+    def _record(self, key, body):
+        response = httpx.post(f"{self.upstream}/api/chat", json={**body, "stream": False}, timeout=None).json()
+        eval_count = response.get("eval_count") or 1
+        entry = {
+            "key": key,
+            "content": response["message"]["content"],
+            "prompt_eval_count": response.get("prompt_eval_count") or 0,
+            "eval_count": eval_count,
+            "rate": eval_count / max(response.get("eval_duration", 0) / 1e9, 1e-3),
+            "latency": response.get("prompt_eval_duration", 0) / 1e9,
+        }
+        self.record.add(entry)
+        return entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--token-rate", type=float, default=None,
+                        help="tokens per second (default 40, or the recorded rate when replaying)")
+    parser.add_argument("--latency", type=float, default=None,
+                        help="seconds before the first token (default 0.2, or as recorded)")
+    parser.add_argument("--record", metavar="FILE", help="proxy to --upstream and save replies here")
+    parser.add_argument("--replay", metavar="FILE", help="serve replies saved with --record")
+    parser.add_argument("--upstream", default="http://127.0.0.1:11434", help="real Ollama, for --record")
+    args = parser.parse_args()
+
+    server = FakeOllama((args.host, args.port), args.token_rate, args.latency,
+                        record=args.record, replay=args.replay, upstream=args.upstream)
+    print(f"fake ollama listening on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+"""Benchmark the app's routes against the fake Ollama backend.
+
+    python bench/run.py                                  # flask server, default mix
+    python bench/run.py --server asgi --concurrency 32
+    python bench/run.py --save-baseline bench/baseline.json
+    python bench/run.py --baseline bench/baseline.json   # exits 1 on a regression
+
+Starts bench/fake_ollama.py and the app (multi-student mode, in a
+throwaway data directory), seeds synthetic students with bench/seed.py,
+then drives each scenario with --concurrency clients. Reports p50/p95/p99
+latency, throughput and the server's peak RSS; chat_send also reports time
+to first token. Model-backed scenarios (chat_send, upload, generate) run
+--llm-iterations times, page scenarios --iterations times.
+"""
+import argparse
+import io
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# ── Scenarios ────────────────────────────────────────────────────
+# Each takes a Session and returns extra measurements (or None); raising
+# counts as an error.
+
+
+def dashboard(s):
+    s.get("/")
+
+
+def grades(s):
+    s.get("/grades")
+
+
+def tracker(s):
+    s.get("/tracker")
+
+
+def chat_history(s):
+    s.get(f"/chat/{s.conversation()}/messages")
+
+
+def chat_search(s):
+    s.get("/chat/search", params={"q": s.rng.choice(["essay", "campus research", "scholar", "robotics"])})
+
+
+def tracker_update(s):
+    s.post(f"/tracker/update/{s.rng.randint(1, s.args.applications)}",
+           json={"notes": f"bench note {s.rng.random():.6f}", "lor_count": s.rng.randint(0, 3)})
+
+
+def tracker_batch(s):
+    ids = s.rng.sample(range(1, s.args.applications + 1), min(10, s.args.applications))
+    _check(s.client.patch("/tracker/applications",
+                          json={"updates": [{"id": i, "notes": f"bench note {s.rng.random():.6f}"} for i in ids]}))
+
+
+def chat_send(s):
+    start = time.perf_counter()
+    ttft = None
+    with s.client.stream("POST", f"/chat/{s.conversation()}/send",
+                         json={"message": "What should I look for in an engineering program?"}) as r:
+        _check(r)
+        for line in r.iter_lines():
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            frame = json.loads(line[6:])
+            if "error" in frame:
+                raise RuntimeError(frame["error"])
+            if ttft is None and "token" in frame:
+                ttft = time.perf_counter() - start
+    return {"ttft": ttft}
+
+
+def upload(s):
+    data = transcript_docx(next(s.counter))
+    r = s.post("/grades/upload", files={"file": ("transcript.docx", data)})
+    s.follow_job(r.json()["job_id"])
+
+
+def generate(s):
+    r = s.post("/colleges/generate", json={"force": True})
+    s.follow_job(r.json()["job_id"])
+
+
+SCENARIOS = {
+    "dashboard": dashboard,
+    "grades": grades,
+    "tracker": tracker,
+    "chat_history": chat_history,
+    "chat_search": chat_search,
+    "tracker_update": tracker_update,
+    "tracker_batch": tracker_batch,
+    "chat_send": chat_send,
+    "upload": upload,
+    "generate": generate,
+}
+LLM_SCENARIOS = {"chat_send", "upload", "generate"}
+
+
+def transcript_docx(n):
+    """A DOCX transcript: rows the rule parser reads plus a few lines left to the model.
+
+    n makes each file unique so uploads are never served from the parse cache.
+    """
+    import docx
+
+    doc = docx.Document()
+    doc.add_paragraph(f"Lincoln High School - Official Transcript #{n}")
+    for level in (9, 10, 11, 12):
+        doc.add_paragraph(f"Grade {level}")
+        table = doc.add_table(rows=0, cols=3)
+        for i in range(8):
+            cells = table.add_row().cells
+            cells[0].text = f"Course {level}-{i} {n}"
+            cells[1].text = random.Random(level * 100 + i).choice(["A", "A-", "B+", "B", "93", "88"])
+            cells[2].text = "1.0"
+        doc.add_paragraph(f"Independent Study {level} - semester project - grade B+ per instructor")
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def _check(r):
+    if r.status_code >= 400:
+        r.read()
+        raise RuntimeError(f"{r.request.method} {r.request.url.path}: HTTP {r.status_code} {r.text[:200]}")
+
+
+class Session:
+    """One simulated user: an HTTP client signed in as a student."""
+
+    counter = itertools.count()  # shared, for unique uploads
+
+    def __init__(self, base_url, student_id, args, seed):
+        self.client = httpx.Client(base_url=base_url, timeout=args.timeout, follow_redirects=False)
+        self.args = args
+        self.rng = random.Random(seed)
+        r = self.client.post(f"/students/select/{student_id}")
+        if r.status_code not in (302, 303):
+            raise RuntimeError(f"could not select student {student_id}: HTTP {r.status_code}")
+
+    def get(self, path, **kwargs):
+        r = self.client.get(path, **kwargs)
+        _check(r)
+        return r
+
+    def post(self, path, **kwargs):
+        r = self.client.post(path, **kwargs)
+        _check(r)
+        return r
+
+    def conversation(self):
+        return self.rng.randint(1, self.args.conversations)
+
+    def follow_job(self, job_id):
+        with self.client.stream("GET", f"/jobs/{job_id}/events") as r:
+            _check(r)
+            for line in r.iter_lines():
+                if line.startswith("data: "):
+                    event = json.loads(line[6:])
+                    if event.get("event") == "status":
+                        if event["status"] != "done":
+                            raise RuntimeError(f"job {event['status']}: {event.get('error')}")
+                        return
+        raise RuntimeError("job stream ended without a status")
+
+    def close(self):
+        self.client.close()
+
+
+# ── Measurement ──────────────────────────────────────────────────
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return {}
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99),
+            "mean": sum(values) / len(values), "max": values[-1]}
+
+
+def run_scenario(name, sessions, iterations, warmup):
+    fn = SCENARIOS[name]
+    for s in sessions[:1]:
+        for _ in range(warmup):
+            fn(s)
+
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, ttfts, errors = [], [], []
+
+    def worker(s):
+        while next(counter) < iterations:
+            start = time.perf_counter()
+            try:
+                extra = fn(s) or {}
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if "ttft" in extra:
+                    ttfts.append(extra["ttft"])
+
+    threads = [threading.Thread(target=worker, args=(s,)) for s in sessions]
+    wall = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall
+
+    result = {"requests": len(latencies), "errors": len(errors),
+              "throughput": len(latencies) / wall if wall else 0.0, **summarize(latencies)}
+    if ttfts:
+        result["ttft"] = summarize(ttfts)
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def peak_rss_mb(pid):
+    """Peak resident set size of a process (Linux only; None elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+# ── Processes ────────────────────────────────────────────────────
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{' '.join(proc.args)} exited with {proc.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"timed out waiting for {url}")
+
+
+def start_fake_ollama(args, port):
+    cmd = [sys.executable, os.path.join(HERE, "fake_ollama.py"), "--port", str(port),
+           "--token-rate", str(args.token_rate), "--latency", str(args.latency)]
+    if args.replay:
+        cmd += ["--replay", args.replay]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    wait_for(f"http://127.0.0.1:{port}/api/tags", proc)
+    return proc
+
+
+def start_server(args, port, env):
+    if args.server == "asgi":
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port), "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port),
+               "--with-threads", "--no-reload", "--no-debugger"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for(f"http://127.0.0.1:{port}/api/llm-status", proc)
+    return proc
+
+
+def stop(proc):
+    if proc is not None and proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+# ── Reporting ────────────────────────────────────────────────────
+
+def _ms(value):
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def report(results):
+    print(f"\n{'scenario':<16}{'reqs':>6}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for name, r in results["scenarios"].items():
+        print(f"{name:<16}{r['requests']:>6}{r['errors']:>6}{_ms(r.get('p50')):>10}{_ms(r.get('p95')):>10}"
+              f"{_ms(r.get('p99')):>10}{r['throughput']:>9.1f}")
+        if "ttft" in r:
+            t = r["ttft"]
+            print(f"{'  first token':<28}{_ms(t.get('p50')):>10}{_ms(t.get('p95')):>10}{_ms(t.get('p99')):>10}")
+        if r.get("first_error"):
+            print(f"  first error: {r['first_error']}")
+    if results["peak_rss_mb"] is not None:
+        print(f"\nserver peak RSS: {results['peak_rss_mb']:.1f} MB")
+
+
+def compare(results, baseline, tolerance):
+    """Regressions against a baseline: slower p95, lower throughput, more memory or new errors."""
+    problems = []
+    if baseline.get("config") != results["config"]:
+        print("warning: baseline was recorded with different settings; comparing anyway")
+    for name, r in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if r["errors"] > base["errors"]:
+            problems.append(f"{name}: {r['errors']} errors (baseline {base['errors']})")
+        if r.get("p95") and base.get("p95") and r["p95"] > base["p95"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {_ms(r['p95'])} ms vs {_ms(base['p95'])} ms")
+        if base["throughput"] and r["throughput"] < base["throughput"] * (1 - tolerance):
+            problems.append(f"{name}: {r['throughput']:.1f} req/s vs {base['throughput']:.1f} req/s")
+    rss, base_rss = results["peak_rss_mb"], baseline.get("peak_rss_mb")
+    if rss and base_rss and rss > base_rss * (1 + tolerance):
+        problems.append(f"peak RSS {rss:.1f} MB vs {base_rss:.1f} MB")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--server", choices=("flask", "asgi"), default="flask")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="comma-separated, from: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8, help="simultaneous clients")
+    parser.add_argument("--iterations", type=int, default=200, help="requests per page scenario")
+    parser.add_argument("--llm-iterations", type=int, default=16, help="requests per model-backed scenario")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--students", type=int, default=4)
+    parser.add_argument("--courses", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=100, help="per conversation")
+    parser.add_argument("--applications", type=int, default=60)
+    parser.add_argument("--token-rate", type=float, default=100, help="fake model tokens per second")
+    parser.add_argument("--latency", type=float, default=0.1, help="fake model seconds to first token")
+    parser.add_argument("--replay", metavar="FILE", help="serve replies recorded with fake_ollama.py --record")
+    parser.add_argument("--out", metavar="FILE", help="write results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against saved results")
+    parser.add_argument("--save-baseline", metavar="FILE", help="save these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression, as a fraction")
+    parser.add_argument("--keep-data", action="store_true", help="leave the seeded data directory in place")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    data_dir = tempfile.mkdtemp(prefix="college-hub-bench-")
+    ollama_port, app_port = free_port(), free_port()
+    env = {**os.environ,
+           "COLLEGE_HUB_MULTI_STUDENT": "1",
+           "COLLEGE_HUB_DATA_DIR": data_dir,
+           "OLLAMA_HOST": f"http://127.0.0.1:{ollama_port}"}
+    fake = server = None
+    sessions = []
+    try:
+        print(f"seeding {args.students} students into {data_dir}")
+        student_ids = subprocess.run(
+            [sys.executable, os.path.join(HERE, "seed.py"), "--students", str(args.students),
+             "--courses", str(args.courses), "--conversations", str(args.conversations),
+             "--messages", str(args.messages), "--applications", str(args.applications)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout.split()
+        fake = start_fake_ollama(args, ollama_port)
+        server = start_server(args, app_port, env)
+        base_url = f"http://127.0.0.1:{app_port}"
+        sessions = [Session(base_url, student_ids[i % len(student_ids)], args, seed=i)
+                    for i in range(args.concurrency)]
+
+        results = {"config": {k: v for k, v in vars(args).items()
+                              if k not in ("out", "baseline", "save_baseline", "tolerance", "keep_data")},
+                   "scenarios": {}}
+        for name in scenarios:
+            iterations = args.llm_iterations if name in LLM_SCENARIOS else args.iterations
+            print(f"running {name} ({iterations} requests)", flush=True)
+            results["scenarios"][name] = run_scenario(name, sessions, iterations, args.warmup)
+        results["peak_rss_mb"] = peak_rss_mb(server.pid)
+    finally:
+        for s in sessions:
+            s.close()
+        stop(server)
+        stop(fake)
+        if not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report(results)
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w") as fh:
+                json.dump(results, fh, indent=2)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            problems = compare(results, json.load(fh), args.tolerance)
+        if problems:
+            print("\nregressions against baseline:")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print("\nno regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
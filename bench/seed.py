@@ -0,0 +1,93 @@
+"""Seed synthetic students for benchmarks.
+
+    COLLEGE_HUB_MULTI_STUDENT=1 COLLEGE_HUB_DATA_DIR=/tmp/bench python bench/seed.py --students 4
+
+Creates students in multi-student mode, each with a profile, courses,
+conversations full of messages, college matches and applications. The
+same arguments always produce the same data.
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+SUBJECTS = ["English", "Algebra", "Geometry", "Calculus", "Statistics", "Biology", "Chemistry",
+            "Physics", "US History", "World History", "Economics", "Spanish", "French",
+            "Computer Science", "Art", "Music", "Psychology", "Government"]
+LEVELS = ["I", "II", "III", "IV", "Honors", "AP"]
+GRADES = ["A+", "A", "A", "A-", "A-", "B+", "B+", "B", "B-", "C+"]
+YEARS = ["Freshman", "Sophomore", "Junior", "Senior"]
+COLLEGES = ["University of Michigan", "Purdue University", "Rice University", "Tufts University",
+            "Boston University", "University of Washington", "Georgia Tech", "Ohio State University",
+            "Northeastern University", "Case Western Reserve University", "University of Rochester",
+            "Lehigh University", "University of Vermont", "Clemson University", "Iowa State University"]
+STATUSES = ["Not Started", "In Progress", "Submitted", "Accepted", "Waitlisted"]
+WORDS = ("college essay campus research engineering biology scholarship financial aid deadline "
+         "major interview visit dorm internship community service robotics debate orchestra "
+         "application recommendation transcript summer program early decision").split()
+
+
+def sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def seed_student(rng, name, courses, conversations, messages, applications):
+    student_id = db.create_student(name)
+    with db.using(db.shard_path(student_id)):
+        db.update_profile(
+            high_school="Lincoln High School", grad_year=2027, sat_score=rng.randint(1200, 1550),
+            major_interests="Engineering, Environmental Science",
+            extracurriculars="Robotics club captain; varsity soccer; volunteer tutor",
+            location_pref="Midwest or Northeast", size_pref="Medium", budget="$40k/year",
+        )
+        db.import_courses([
+            {"name": f"{SUBJECTS[i % len(SUBJECTS)]} {LEVELS[(i // len(SUBJECTS)) % len(LEVELS)]} {i}",
+             "grade": rng.choice(GRADES), "year": YEARS[i % len(YEARS)],
+             "course_type": rng.choice(["Regular", "Regular", "Honors", "AP"]), "credits": 1.0}
+            for i in range(courses)
+        ])
+        for c in range(conversations):
+            cid = db.create_conversation(f"Planning session {c + 1}")
+            for m in range(messages):
+                role = "user" if m % 2 == 0 else "assistant"
+                db.add_message(cid, role, sentence(rng, 12 if role == "user" else 60))
+        db.save_college_matches([
+            {"name": college, "tier": ["reach", "match", "safety"][i % 3], "fit_score": 90 - i,
+             "reasoning": sentence(rng, 20), "location": "Somewhere, USA", "size": "Medium"}
+            for i, college in enumerate(COLLEGES)
+        ])
+        for a in range(applications):
+            db.add_application(f"{COLLEGES[a % len(COLLEGES)]} #{a}",
+                               deadline=f"2026-{1 + a % 12:02d}-{1 + a % 28:02d}")
+        for app in db.get_applications():
+            db.update_application(app["id"], status=rng.choice(STATUSES), lor_count=rng.randint(0, 3))
+    return student_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--students", type=int, default=4)
+    parser.add_argument("--courses", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=100, help="per conversation")
+    parser.add_argument("--applications", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if not db.MULTI_STUDENT:
+        sys.exit("seed.py writes per-student shards; set COLLEGE_HUB_MULTI_STUDENT=1 and COLLEGE_HUB_DATA_DIR")
+
+    rng = random.Random(args.seed)
+    db.init_db(db.CATALOG_PATH)
+    ids = [seed_student(rng, f"Bench Student {i + 1}", args.courses, args.conversations,
+                        args.messages, args.applications)
+           for i in range(args.students)]
+    db.close_all()
+    print(" ".join(map(str, ids)))
+
+
+if __name__ == "__main__":
+    main()
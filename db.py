@@ -1,19 +1,390 @@
 import sqlite3
+import json
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import metrics
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "college_hub.db")
 
+# Multi-student mode keeps a small catalog database of students plus one
+# shard database per student, so students never contend for the same file.
+MULTI_STUDENT = os.environ.get("COLLEGE_HUB_MULTI_STUDENT", "") == "1"
+DATA_DIR = os.environ.get("COLLEGE_HUB_DATA_DIR", os.path.join(os.path.dirname(__file__), "data"))
+CATALOG_PATH = os.path.join(DATA_DIR, "catalog.db")
+
+_current_db = ContextVar("college_hub_db", default=None)
+
+
+def current_db():
+    """Path of the database the helpers operate on in this context."""
+    return _current_db.get() or DB_PATH
+
+
+def select_db(path):
+    """Route helpers in this context to path; returns a token for release_db()."""
+    return _current_db.set(path)
+
+
+def release_db(token):
+    _current_db.reset(token)
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+
+@contextmanager
+def using(path):
+    """Route helpers inside the block to path."""
+    token = select_db(path)
+    try:
+        yield path
+    finally:
+        release_db(token)
+
+
+def shard_path(student_id):
+    return os.path.join(DATA_DIR, "students", f"student_{int(student_id)}.db")
+
+
+# ── Connections ──────────────────────────────────────────────────
+#
+# Connections are pooled per database file and reused instead of opened per
+# helper call. A thread holds at most one checked-out connection per file, so
+# helpers that call other helpers share it (and its transaction). WAL lets
+# readers and the single writer proceed without blocking each other. Shards
+# are opened lazily and the least recently used ones closed past a limit.
+
+POOL_SIZE = 8
+MAX_OPEN_DATABASES = 32
+BUSY_TIMEOUT = 5.0  # seconds to wait on a locked database before failing
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",    # durable in WAL mode, fsync only at checkpoints
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA cache_size = -8000",      # ~8 MB page cache per connection
+    "PRAGMA mmap_size = 67108864",    # 64 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+)
+
+_local = threading.local()
+_pools = OrderedDict()  # path -> idle connections, least recently used first
+_pool_lock = threading.Lock()
+
+
+# ── Query tracing ────────────────────────────────────────────────
+# Opt-in (COLLEGE_HUB_SQL_TRACE=1): every statement's time and row count is
+# aggregated by its normalized text, and statements slower than
+# SLOW_QUERY_MS get their EXPLAIN QUERY PLAN captured, with full table scans
+# flagged. Read the result at /admin/queries. Off, it costs one flag check.
+
+SQL_TRACE = os.environ.get("COLLEGE_HUB_SQL_TRACE", "") == "1"
+SLOW_QUERY_MS = float(os.environ.get("COLLEGE_HUB_SLOW_QUERY_MS", "20"))
+
+_query_stats = {}  # normalized sql -> aggregate dict
+_query_lock = threading.Lock()
+
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_SQL_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$")
+_SQL_TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?(\w+)", re.IGNORECASE)
+_SQL_KEYWORDS = {"where", "join", "left", "right", "inner", "outer", "cross", "natural", "on", "using",
+                 "group", "order", "limit", "union", "except", "intersect", "indexed", "not", "window"}
+
+
+def normalize_sql(sql):
+    """Statement text with literals replaced by ? and whitespace collapsed.
+
+    IN lists of any length collapse to one entry, so they aggregate together.
+    """
+    sql = _SQL_STRING.sub("?", sql)
+    sql = _SQL_NUMBER.sub("?", sql)
+    sql = " ".join(sql.split())
+    return _SQL_IN_LIST.sub("IN (?, ...)", sql)
+
+
+def _table_aliases(sql):
+    """alias -> table for the aliased FROM/JOIN tables of a statement (first use wins)."""
+    aliases = {}
+    for table, alias in _SQL_TABLE_ALIAS.findall(sql):
+        if alias.lower() not in _SQL_KEYWORDS:
+            aliases.setdefault(alias.lower(), table)
+    return aliases
+
+
+def full_scans(plan, sql=""):
+    """Tables an EXPLAIN QUERY PLAN reads in full, as "table" or "table AS alias".
+
+    The plan names aliased tables by their alias, so sql (the statement,
+    followed by the bodies of any views it reads) is used to map them back. Index and virtual-table scans don't count, nor do scans of
+    subqueries and views the plan itself built (MATERIALIZE / CO-ROUTINE
+    steps).
+    """
+    built = {step.split(" ", 1)[1] for step in plan if step.startswith(("MATERIALIZE ", "CO-ROUTINE "))}
+    aliases = _table_aliases(sql)
+    scans = []
+    for step in plan:
+        m = _FULL_SCAN.match(step)
+        if not m or m.group(1) in built or m.group(1) == "CONSTANT":
+            continue
+        name, alias = m.groups()
+        if alias is None and name.lower() in aliases:
+            name, alias = aliases[name.lower()], name
+        scans.append(f"{name} AS {alias}" if alias and alias != name else name)
+    return scans
+
+
+class _Execution:
+    """One execution of a statement, accumulated across execute and fetches."""
+
+    __slots__ = ("stats", "sql", "parameters", "elapsed", "slow")
+
+    def __init__(self, sql, parameters):
+        key = normalize_sql(sql)
+        with _query_lock:
+            stats = _query_stats.get(key)
+            if stats is None:
+                stats = _query_stats[key] = {"sql": key, "calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                             "rows": 0, "slow_calls": 0, "plan": None, "full_scans": []}
+            stats["calls"] += 1
+        self.stats = stats
+        self.sql = sql
+        self.parameters = parameters
+        self.elapsed = 0.0
+        self.slow = False
+
+    def add(self, conn, elapsed, rows):
+        self.elapsed += elapsed
+        ms = self.elapsed * 1000
+        with _query_lock:
+            self.stats["total_ms"] += elapsed * 1000
+            self.stats["max_ms"] = max(self.stats["max_ms"], ms)
+            self.stats["rows"] += rows
+            if self.slow or ms < SLOW_QUERY_MS:
+                return
+            self.slow = True
+            self.stats["slow_calls"] += 1
+            capture = self.stats["plan"] is None
+        if capture and self.parameters is not None:
+            self._capture_plan(conn)
+
+    def _capture_plan(self, conn):
+        try:
+            # The base class's execute, so the EXPLAIN isn't itself traced.
+            rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + self.sql, self.parameters).fetchall()
+        except sqlite3.Error:
+            return
+        plan = [row[3] for row in rows]
+        views = sqlite3.Connection.execute(
+            conn, "SELECT name, sql FROM sqlite_master WHERE type = 'view'").fetchall()
+        words = set(re.findall(r"\w+", self.sql.lower()))
+        sources = "\n".join([self.sql] + [view_sql for name, view_sql in views if name.lower() in words])
+        with _query_lock:
+            self.stats["plan"] = plan
+            self.stats["full_scans"] = full_scans(plan, sources)
+
+
+def query_stats():
+    """Traced statements, most total time first."""
+    with _query_lock:
+        stats = [dict(s) for s in _query_stats.values()]
+    for s in stats:
+        s["avg_ms"] = round(s["total_ms"] / s["calls"], 3) if s["calls"] else 0.0
+        s["total_ms"] = round(s["total_ms"], 3)
+        s["max_ms"] = round(s["max_ms"], 3)
+    return sorted(stats, key=lambda s: s["total_ms"], reverse=True)
+
+
+def reset_query_stats():
+    with _query_lock:
+        _query_stats.clear()
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that adds the time spent executing and fetching to the request's
+    DB time and, when SQL_TRACE is on, to the statement's trace."""
+
+    _execution = None
+
+    def _done(self, start, rows=0):
+        elapsed = time.perf_counter() - start
+        metrics.add_db_time(elapsed)
+        if self._execution is not None:
+            self._execution.add(self.connection, elapsed, rows)
+
+    def execute(self, sql, parameters=()):
+        self._execution = _Execution(sql, parameters) if SQL_TRACE else None
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._done(start, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters):
+        # No single parameter set to EXPLAIN with, so no plan is captured.
+        self._execution = _Execution(sql, None) if SQL_TRACE else None
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._done(start, max(self.rowcount, 0))
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._done(start, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._done(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._done(start, len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._done(start)
+            raise
+        self._done(start, 1)
+        return row
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose shortcut methods go through TimedCursor.
+
+    sqlite3.Connection.execute() builds a plain cursor internally, so these
+    are re-routed through self.cursor().
+    """
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def get_db(path=None):
+    """Open a new, fully configured connection (prefer connection())."""
+    conn = sqlite3.connect(
+        path or current_db(),
+        timeout=BUSY_TIMEOUT,
+        isolation_level=None,  # autocommit; transaction() issues BEGIN explicitly
+        check_same_thread=False,  # pooled connections move between threads
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=TimedConnection,
+    )
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
+    conn.create_function("course_key", 1, course_key, deterministic=True)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _checkout(path):
+    with _pool_lock:
+        idle = _pools.get(path)
+        if idle is not None:
+            _pools.move_to_end(path)
+            if idle:
+                return idle.pop()
+    if path not in _migrated and os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = get_db(path)
+    if path not in _migrated:
+        _ensure_schema(path, conn)
     return conn
 
 
-def init_db():
-    conn = get_db()
-    conn.executescript("""
+def _checkin(path, conn):
+    if conn.in_transaction:
+        conn.rollback()
+    evicted = []
+    with _pool_lock:
+        idle = _pools.get(path)
+        if idle is None:
+            idle = _pools[path] = []
+            while len(_pools) > MAX_OPEN_DATABASES:
+                _, stale = _pools.popitem(last=False)
+                evicted.extend(stale)
+        if len(idle) < POOL_SIZE:
+            idle.append(conn)
+        else:
+            evicted.append(conn)
+    for c in evicted:
+        c.close()
+
+
+@contextmanager
+def connection(path=None):
+    """Yield this thread's connection to path (default: current_db())."""
+    path = path or current_db()
+    conns = _local.__dict__.setdefault("conns", {})
+    conn = conns.get(path)
+    if conn is not None:
+        yield conn
+        return
+
+    conn = conns[path] = _checkout(path)
+    try:
+        yield conn
+    finally:
+        del conns[path]
+        _checkin(path, conn)
+
+
+@contextmanager
+def transaction(path=None):
+    """Run the block as one write transaction; nested calls join the outer one."""
+    with connection(path) as conn:
+        if conn.in_transaction:
+            yield conn
+            return
+        # IMMEDIATE takes the write lock up front so two writers never
+        # deadlock trying to upgrade from a read lock.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def close_all():
+    """Close every idle pooled connection."""
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for idle in pools:
+        for conn in idle:
+            conn.close()
+
+
+# ── Schema migrations ────────────────────────────────────────────
+#
+# Each entry upgrades the schema by one version; PRAGMA user_version records
+# how many have been applied. Append new migrations, never edit old ones.
+
+MIGRATIONS = [
+    # 1: initial schema
+    """
     CREATE TABLE IF NOT EXISTS profile (
         id INTEGER PRIMARY KEY CHECK (id = 1),
         name TEXT DEFAULT '',
@@ -87,27 +458,344 @@ def init_db():
     );
 
     INSERT OR IGNORE INTO profile (id) VALUES (1);
-    """)
-    conn.commit()
-    conn.close()
+    """,
+    # 2: indexes behind the dashboard aggregates
+    """
+    CREATE INDEX IF NOT EXISTS idx_applications_deadline ON applications (deadline);
+    CREATE INDEX IF NOT EXISTS idx_college_matches_tier ON college_matches (tier, fit_score DESC);
+    """,
+    # 3: running GPA totals per (year, course_type), maintained by triggers.
+    # grade_scale/type_bonus mirror GRADE_POINTS/WEIGHT_BONUS below.
+    """
+    CREATE TABLE grade_scale (grade TEXT PRIMARY KEY, points REAL NOT NULL) WITHOUT ROWID;
+    INSERT INTO grade_scale VALUES
+        ('A+', 4.0), ('A', 4.0), ('A-', 3.7),
+        ('B+', 3.3), ('B', 3.0), ('B-', 2.7),
+        ('C+', 2.3), ('C', 2.0), ('C-', 1.7),
+        ('D+', 1.3), ('D', 1.0), ('D-', 0.7),
+        ('F', 0.0);
+
+    CREATE TABLE type_bonus (course_type TEXT PRIMARY KEY, bonus REAL NOT NULL) WITHOUT ROWID;
+    INSERT INTO type_bonus VALUES
+        ('AP', 1.0), ('IB', 1.0), ('Honors', 0.5), ('Dual Enrollment', 0.5), ('Regular', 0.0);
+
+    CREATE TABLE gpa_totals (
+        year TEXT NOT NULL,
+        course_type TEXT NOT NULL,
+        course_count INTEGER NOT NULL DEFAULT 0,
+        credits REAL NOT NULL DEFAULT 0,
+        uw_points REAL NOT NULL DEFAULT 0,
+        w_points REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (year, course_type)
+    ) WITHOUT ROWID;
+
+    CREATE VIEW course_points AS
+    SELECT c.id, c.year, COALESCE(c.course_type, 'Regular') AS course_type, c.credits,
+           COALESCE(g.points, 0.0) * c.credits AS uw_points,
+           (COALESCE(g.points, 0.0) + COALESCE(b.bonus, 0.0)) * c.credits AS w_points
+    FROM courses c
+    LEFT JOIN grade_scale g ON g.grade = c.grade
+    LEFT JOIN type_bonus b ON b.course_type = c.course_type;
+
+    INSERT INTO gpa_totals (year, course_type, course_count, credits, uw_points, w_points)
+    SELECT year, course_type, COUNT(*), SUM(credits), SUM(uw_points), SUM(w_points)
+    FROM course_points GROUP BY year, course_type;
+
+    CREATE TRIGGER courses_gpa_insert AFTER INSERT ON courses BEGIN
+        INSERT INTO gpa_totals (year, course_type, course_count, credits, uw_points, w_points)
+        SELECT year, course_type, 1, credits, uw_points, w_points FROM course_points WHERE id = NEW.id
+        ON CONFLICT (year, course_type) DO UPDATE SET
+            course_count = course_count + 1,
+            credits = credits + excluded.credits,
+            uw_points = uw_points + excluded.uw_points,
+            w_points = w_points + excluded.w_points;
+    END;
+
+    CREATE TRIGGER courses_gpa_delete AFTER DELETE ON courses BEGIN
+        UPDATE gpa_totals SET
+            course_count = course_count - 1,
+            credits = credits - OLD.credits,
+            uw_points = uw_points - COALESCE((SELECT points FROM grade_scale WHERE grade = OLD.grade), 0.0) * OLD.credits,
+            w_points = w_points - (COALESCE((SELECT points FROM grade_scale WHERE grade = OLD.grade), 0.0)
+                                   + COALESCE((SELECT bonus FROM type_bonus WHERE course_type = OLD.course_type), 0.0)) * OLD.credits
+        WHERE year = OLD.year AND course_type = COALESCE(OLD.course_type, 'Regular');
+        DELETE FROM gpa_totals WHERE course_count <= 0;
+    END;
+
+    CREATE TRIGGER courses_gpa_update AFTER UPDATE OF grade, year, course_type, credits ON courses BEGIN
+        UPDATE gpa_totals SET
+            course_count = course_count - 1,
+            credits = credits - OLD.credits,
+            uw_points = uw_points - COALESCE((SELECT points FROM grade_scale WHERE grade = OLD.grade), 0.0) * OLD.credits,
+            w_points = w_points - (COALESCE((SELECT points FROM grade_scale WHERE grade = OLD.grade), 0.0)
+                                   + COALESCE((SELECT bonus FROM type_bonus WHERE course_type = OLD.course_type), 0.0)) * OLD.credits
+        WHERE year = OLD.year AND course_type = COALESCE(OLD.course_type, 'Regular');
+        DELETE FROM gpa_totals WHERE course_count <= 0;
+        INSERT INTO gpa_totals (year, course_type, course_count, credits, uw_points, w_points)
+        SELECT year, course_type, 1, credits, uw_points, w_points FROM course_points WHERE id = NEW.id
+        ON CONFLICT (year, course_type) DO UPDATE SET
+            course_count = course_count + 1,
+            credits = credits + excluded.credits,
+            uw_points = uw_points + excluded.uw_points,
+            w_points = w_points + excluded.w_points;
+    END;
+    """,
+    # 4: natural key (normalized name + year) for course upserts; keeps the
+    # newest row of any existing duplicates
+    """
+    ALTER TABLE courses ADD COLUMN name_key TEXT;
+    UPDATE courses SET name_key = course_key(name);
+    DELETE FROM courses WHERE id NOT IN (
+        SELECT MAX(id) FROM courses GROUP BY name_key, year
+    );
+    CREATE UNIQUE INDEX idx_courses_natural_key ON courses (name_key, year);
+    """,
+    # 5: version counter bumped whenever the profile or courses change, so
+    # derived data (e.g. the LLM student context) can be cached against it
+    """
+    CREATE TABLE data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    INSERT INTO data_version (id, version) VALUES (1, 0);
+
+    CREATE TRIGGER profile_data_version AFTER UPDATE ON profile BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER courses_insert_data_version AFTER INSERT ON courses BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER courses_update_data_version AFTER UPDATE ON courses BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER courses_delete_data_version AFTER DELETE ON courses BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    """,
+    # 6: general-purpose result cache (e.g. LLM outputs keyed by input hash)
+    """
+    CREATE TABLE kv_cache (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    ) WITHOUT ROWID;
+    CREATE INDEX idx_kv_cache_lru ON kv_cache (namespace, last_used);
+    """,
+    # 7: background jobs (see jobs.py)
+    """
+    CREATE TABLE jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued'
+            CHECK (status IN ('queued', 'running', 'done', 'failed', 'cancelled')),
+        progress TEXT,
+        result TEXT,
+        error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        heartbeat_at REAL
+    );
+    CREATE INDEX idx_jobs_kind ON jobs (kind, created_at);
+    """,
+    # 8: rolling summary of the older part of each conversation; summary_upto
+    # is the id of the last message folded into it
+    """
+    ALTER TABLE conversations ADD COLUMN summary TEXT NOT NULL DEFAULT '';
+    ALTER TABLE conversations ADD COLUMN summary_upto INTEGER NOT NULL DEFAULT 0;
+    """,
+    # 9: per-conversation message lookups in id order (keyset pagination),
+    # and a trigger-maintained message count
+    """
+    CREATE INDEX idx_messages_conversation ON messages (conversation_id, id);
+
+    ALTER TABLE conversations ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0;
+    UPDATE conversations SET message_count =
+        (SELECT COUNT(*) FROM messages WHERE conversation_id = conversations.id);
+
+    CREATE TRIGGER messages_insert_count AFTER INSERT ON messages BEGIN
+        UPDATE conversations SET message_count = message_count + 1 WHERE id = NEW.conversation_id;
+    END;
+    CREATE TRIGGER messages_delete_count AFTER DELETE ON messages BEGIN
+        UPDATE conversations SET message_count = message_count - 1 WHERE id = OLD.conversation_id;
+    END;
+    """,
+    # 10: full-text search over message contents and conversation titles;
+    # external-content FTS5 tables kept in sync by triggers
+    """
+    CREATE VIRTUAL TABLE messages_fts USING fts5(
+        content, content='messages', content_rowid='id', tokenize='porter unicode61', prefix='2 3'
+    );
+    INSERT INTO messages_fts (rowid, content) SELECT id, content FROM messages;
+
+    CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, content) VALUES (NEW.id, NEW.content);
+    END;
+    CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+    END;
+    CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+        INSERT INTO messages_fts (rowid, content) VALUES (NEW.id, NEW.content);
+    END;
+
+    CREATE VIRTUAL TABLE conversations_fts USING fts5(
+        title, content='conversations', content_rowid='id', tokenize='porter unicode61'
+    );
+    INSERT INTO conversations_fts (rowid, title) SELECT id, title FROM conversations;
+
+    CREATE TRIGGER conversations_fts_insert AFTER INSERT ON conversations BEGIN
+        INSERT INTO conversations_fts (rowid, title) VALUES (NEW.id, NEW.title);
+    END;
+    CREATE TRIGGER conversations_fts_delete AFTER DELETE ON conversations BEGIN
+        INSERT INTO conversations_fts (conversations_fts, rowid, title) VALUES ('delete', OLD.id, OLD.title);
+    END;
+    CREATE TRIGGER conversations_fts_update AFTER UPDATE OF title ON conversations BEGIN
+        INSERT INTO conversations_fts (conversations_fts, rowid, title) VALUES ('delete', OLD.id, OLD.title);
+        INSERT INTO conversations_fts (rowid, title) VALUES (NEW.id, NEW.title);
+    END;
+    """,
+    # 11: assistant replies are saved while they stream; complete = 0 marks
+    # one that was cut off (disconnect or crash) or is still being written
+    """
+    ALTER TABLE messages ADD COLUMN complete INTEGER NOT NULL DEFAULT 1;
+    """,
+    # 12: courses may share a name and year (fall/spring halves, two 0.5
+    # credit PE rows), so the natural-key index is no longer unique
+    """
+    DROP INDEX IF EXISTS idx_courses_natural_key;
+    CREATE INDEX IF NOT EXISTS idx_courses_name_key ON courses (name_key, year);
+    """,
+    # 13: credits used to be accepted unchecked; infinite or missing values
+    # left NaN in gpa_totals and made those courses impossible to delete.
+    # Reset them to the default and rebuild the totals.
+    """
+    DELETE FROM gpa_totals;
+    UPDATE courses SET credits = 1.0
+    WHERE credits IS NULL OR NOT (credits BETWEEN 0.5 AND 2.0);
+    DELETE FROM gpa_totals;
+    INSERT INTO gpa_totals (year, course_type, course_count, credits, uw_points, w_points)
+    SELECT year, course_type, COUNT(*), SUM(credits), SUM(uw_points), SUM(w_points)
+    FROM course_points GROUP BY year, course_type;
+    """,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+CATALOG_MIGRATIONS = [
+    # 1: student directory
+    """
+    CREATE TABLE IF NOT EXISTS students (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+]
+
+_migrated = set()
+_init_lock = threading.Lock()
+
+
+def _statements(script):
+    """Split a migration script into single statements (trigger bodies stay whole)."""
+    statements = []
+    start = 0
+    for i, ch in enumerate(script):
+        if ch == ";" and sqlite3.complete_statement(script[start:i + 1]):
+            statements.append(script[start:i + 1])
+            start = i + 1
+    if script[start:].strip():
+        statements.append(script[start:])
+    return statements
+
+
+def migrate(conn, migrations=None):
+    """Apply any migrations newer than the database's user_version.
+
+    Each step takes the write lock first and re-reads the version under it,
+    so several processes starting on the same database apply it only once.
+    """
+    if migrations is None:
+        migrations = MIGRATIONS
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    if current > len(migrations):
+        raise RuntimeError(
+            f"Database schema v{current} is newer than this app supports (v{len(migrations)})"
+        )
+    applied = 0
+    for version in range(current + 1, len(migrations) + 1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < version:
+                for statement in _statements(migrations[version - 1]):
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return applied
+
+
+def _ensure_schema(path, conn):
+    with _init_lock:
+        if path not in _migrated:
+            migrate(conn, CATALOG_MIGRATIONS if path == CATALOG_PATH else MIGRATIONS)
+            _migrated.add(path)
+
+
+def init_db(path=None):
+    """Bring the schema up to date. Cheap no-op once a database has been opened."""
+    with connection(path):
+        pass
+
+
+# ── Student catalog (multi-student mode) ─────────────────────────
+
+def get_students():
+    with connection(CATALOG_PATH) as conn:
+        rows = conn.execute("SELECT * FROM students ORDER BY name COLLATE NOCASE").fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_student(student_id):
+    with connection(CATALOG_PATH) as conn:
+        row = conn.execute("SELECT * FROM students WHERE id = ?", (student_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def create_student(name):
+    with transaction(CATALOG_PATH) as conn:
+        cur = conn.execute("INSERT INTO students (name) VALUES (?)", (name,))
+    student_id = cur.lastrowid
+    with using(shard_path(student_id)):
+        update_profile(name=name)
+    return student_id
 
 
 # ── Profile helpers ──────────────────────────────────────────────
 
 def get_profile():
-    conn = get_db()
-    row = conn.execute("SELECT * FROM profile WHERE id = 1").fetchone()
-    conn.close()
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM profile WHERE id = 1").fetchone()
     return dict(row) if row else {}
 
 
 def update_profile(**kwargs):
-    conn = get_db()
     sets = ", ".join(f"{k} = ?" for k in kwargs)
     vals = list(kwargs.values())
-    conn.execute(f"UPDATE profile SET {sets}, updated_at = CURRENT_TIMESTAMP WHERE id = 1", vals)
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(f"UPDATE profile SET {sets}, updated_at = CURRENT_TIMESTAMP WHERE id = 1", vals)
+
+
+def get_data_version():
+    """Counter that changes whenever the profile or courses change."""
+    with connection() as conn:
+        return conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
 
 
 # ── Course helpers ───────────────────────────────────────────────
@@ -124,32 +812,100 @@ WEIGHT_BONUS = {"AP": 1.0, "IB": 1.0, "Honors": 0.5, "Dual Enrollment": 0.5, "Re
 
 
 def get_courses():
-    conn = get_db()
-    rows = conn.execute("SELECT * FROM courses ORDER BY year, name").fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("SELECT * FROM courses ORDER BY year, name").fetchall()
     return [dict(r) for r in rows]
 
 
+def course_key(name):
+    """Normalized course name used with the year as the natural key."""
+    return " ".join(str(name or "").split()).lower()
+
+
 def add_course(name, grade, year, course_type="Regular", credits=1.0):
-    conn = get_db()
-    conn.execute(
-        "INSERT INTO courses (name, grade, year, course_type, credits) VALUES (?, ?, ?, ?, ?)",
-        (name, grade, year, course_type, credits),
-    )
-    conn.commit()
-    conn.close()
+    """Add a course. Courses with the same name and year are kept side by side."""
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO courses (name, name_key, grade, year, course_type, credits) VALUES (?, ?, ?, ?, ?, ?)",
+            (name, course_key(name), grade, year, course_type, credits),
+        )
+
+
+def import_courses(courses):
+    """Upsert many courses in a single transaction.
+
+    Courses are matched on normalized name + year against the stored ones
+    only, so same-name rows in the batch (semester halves) are all kept.
+    Rows missing a name or grade, and rows identical to a stored course, are
+    skipped. A changed course updates the newest stored course it matches
+    that no other row in the batch has claimed. Returns
+    inserted/updated/skipped counts.
+    """
+    rows = []
+    skipped = 0
+    for c in courses:
+        name = str(c.get("name") or "").strip()
+        if not name or not c.get("grade"):
+            skipped += 1
+            continue
+        fields = (name, c["grade"], c.get("course_type") or "Regular", float(c.get("credits", 1.0)))
+        rows.append(((course_key(name), c.get("year") or "Junior"), fields))
+
+    inserts = []
+    updates = []
+    with transaction() as conn:
+        existing = {}  # (name_key, year) -> {id: fields}, oldest first
+        for r in conn.execute("SELECT id, name, name_key, grade, year, course_type, credits FROM courses "
+                              "ORDER BY id"):
+            existing.setdefault((r["name_key"], r["year"]), {})[r["id"]] = (
+                r["name"], r["grade"], r["course_type"], r["credits"])
+
+        # Identical rows claim their stored course first, so a changed row
+        # never overwrites a course that another row in the batch matches.
+        changed = []
+        for key, fields in rows:
+            matches = existing.get(key, {})
+            same = next((course_id for course_id, old in matches.items() if old == fields), None)
+            if same is None:
+                changed.append((key, fields))
+            else:
+                del matches[same]
+                skipped += 1
+        for (name_key, year), fields in changed:
+            matches = existing.get((name_key, year), {})
+            if matches:
+                course_id = list(matches)[-1]
+                del matches[course_id]
+                updates.append(fields + (course_id,))
+            else:
+                inserts.append((fields[0], name_key, fields[1], year, fields[2], fields[3]))
+        conn.executemany(
+            "INSERT INTO courses (name, name_key, grade, year, course_type, credits) VALUES (?, ?, ?, ?, ?, ?)",
+            inserts,
+        )
+        conn.executemany(
+            "UPDATE courses SET name = ?, grade = ?, course_type = ?, credits = ? WHERE id = ?",
+            updates,
+        )
+    return {"inserted": len(inserts), "updated": len(updates), "skipped": skipped}
 
 
 def delete_course(course_id):
-    conn = get_db()
-    conn.execute("DELETE FROM courses WHERE id = ?", (course_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM courses WHERE id = ?", (course_id,))
 
 
-def calc_gpa(courses):
-    if not courses:
+def _gpa(credits, uw_points, w_points):
+    if not credits:
         return {"unweighted": 0.0, "weighted": 0.0}
+    return {
+        "unweighted": round(uw_points / credits, 3),
+        "weighted": round(w_points / credits, 3),
+    }
+
+
+def _course_sums(courses):
+    """(credits, unweighted points, weighted points) for a list of course dicts."""
     total_credits = 0
     uw_points = 0
     w_points = 0
@@ -160,176 +916,448 @@ def calc_gpa(courses):
         uw_points += gp * cr
         w_points += (gp + bonus) * cr
         total_credits += cr
-    if total_credits == 0:
-        return {"unweighted": 0.0, "weighted": 0.0}
+    return total_credits, uw_points, w_points
+
+
+def calc_gpa(courses):
+    """GPA from a full course list. Prefer get_gpa() for stored courses."""
+    return _gpa(*_course_sums(courses))
+
+
+def get_gpa_totals():
+    """Running GPA sums per (year, course_type), kept current by triggers."""
+    with connection() as conn:
+        rows = conn.execute("SELECT * FROM gpa_totals").fetchall()
+    return [dict(r) for r in rows]
+
+
+def _rollup(totals, key=None):
+    groups = {}
+    for t in totals:
+        g = groups.setdefault(t[key] if key else None, [0, 0.0, 0.0, 0.0])
+        g[0] += t["course_count"]
+        g[1] += t["credits"]
+        g[2] += t["uw_points"]
+        g[3] += t["w_points"]
+    return {k: {"course_count": v[0], **_gpa(*v[1:])} for k, v in groups.items()}
+
+
+def get_gpa(breakdown=False, totals=None):
+    """Current GPA from the running totals, without scanning courses.
+
+    With breakdown=True the result also carries "by_year" and "by_type" maps.
+    """
+    if totals is None:
+        totals = get_gpa_totals()
+    overall = _rollup(totals).get(None, {"course_count": 0, **_gpa(0, 0, 0)})
+    gpa = {"unweighted": overall["unweighted"], "weighted": overall["weighted"]}
+    if breakdown:
+        gpa["course_count"] = overall["course_count"]
+        gpa["by_year"] = _rollup(totals, "year")
+        gpa["by_type"] = _rollup(totals, "course_type")
+    return gpa
+
+
+def project_gpa(hypothetical):
+    """Project the GPA if the hypothetical courses were added to the current ones."""
+    totals = get_gpa_totals()
+    extra = [
+        {
+            "year": c.get("year") or "Senior",
+            "course_type": c.get("course_type") or "Regular",
+            "course_count": 1,
+            **dict(zip(("credits", "uw_points", "w_points"), _course_sums([c]))),
+        }
+        for c in hypothetical
+    ]
     return {
-        "unweighted": round(uw_points / total_credits, 3),
-        "weighted": round(w_points / total_credits, 3),
+        "current": get_gpa(breakdown=True, totals=totals),
+        "projected": get_gpa(breakdown=True, totals=totals + extra),
     }
 
 
 # ── Conversation / message helpers ───────────────────────────────
 
 def get_conversations():
-    conn = get_db()
-    rows = conn.execute("SELECT * FROM conversations ORDER BY updated_at DESC").fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("SELECT * FROM conversations ORDER BY updated_at DESC").fetchall()
     return [dict(r) for r in rows]
 
 
 def create_conversation(title="New Conversation"):
-    conn = get_db()
-    cur = conn.execute("INSERT INTO conversations (title) VALUES (?)", (title,))
-    cid = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return cid
-
-
-def get_messages(conversation_id):
-    conn = get_db()
-    rows = conn.execute(
-        "SELECT * FROM messages WHERE conversation_id = ? ORDER BY created_at",
-        (conversation_id,),
-    ).fetchall()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.execute("INSERT INTO conversations (title) VALUES (?)", (title,))
+    return cur.lastrowid
+
+
+def get_conversation(conversation_id):
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def get_messages(conversation_id, after_id=0):
+    """Messages of a conversation, optionally only those after message after_id."""
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT * FROM messages WHERE conversation_id = ? AND id > ? ORDER BY id",
+            (conversation_id, after_id),
+        ).fetchall()
     return [dict(r) for r in rows]
 
 
-def add_message(conversation_id, role, content):
-    conn = get_db()
-    conn.execute(
-        "INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)",
-        (conversation_id, role, content),
-    )
-    conn.execute(
-        "UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-        (conversation_id,),
-    )
-    conn.commit()
-    conn.close()
+def get_messages_page(conversation_id, before_id=None, limit=30):
+    """Up to limit messages older than before_id (newest if None), oldest first.
+
+    Returns (messages, has_more). Pass the first message's id as before_id to
+    get the page before it.
+    """
+    sql = "SELECT * FROM messages WHERE conversation_id = ?"
+    params = [conversation_id]
+    if before_id is not None:
+        sql += " AND id < ?"
+        params.append(before_id)
+    sql += " ORDER BY id DESC LIMIT ?"
+    with connection() as conn:
+        rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    has_more = len(rows) > limit
+    return [dict(r) for r in reversed(rows[:limit])], has_more
+
+
+def add_message(conversation_id, role, content, complete=True):
+    """Append a message and return its id."""
+    with transaction() as conn:
+        cur = conn.execute(
+            "INSERT INTO messages (conversation_id, role, content, complete) VALUES (?, ?, ?, ?)",
+            (conversation_id, role, content, int(complete)),
+        )
+        conn.execute(
+            "UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (conversation_id,),
+        )
+    return cur.lastrowid
+
+
+def update_message(message_id, content, complete):
+    """Checkpoint or finish a message that is being written incrementally."""
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE messages SET content = ?, complete = ? WHERE id = ?",
+            (content, int(complete), message_id),
+        )
 
 
 def update_conversation_title(conversation_id, title):
-    conn = get_db()
-    conn.execute("UPDATE conversations SET title = ? WHERE id = ?", (title, conversation_id))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("UPDATE conversations SET title = ? WHERE id = ?", (title, conversation_id))
+
+
+def update_conversation_summary(conversation_id, summary, upto):
+    """Store a new rolling summary covering messages up to id upto.
+
+    Ignored if the stored summary already reaches further, so a slow,
+    stale summarizer can't roll it back.
+    """
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE conversations SET summary = ?, summary_upto = ? WHERE id = ? AND summary_upto < ?",
+            (summary, upto, conversation_id, upto),
+        )
+
+
+# Marks around matched terms in search snippets; callers escape the text
+# and turn these into highlighting.
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+
+def fts_query(text):
+    """Turn free text into a safe FTS5 query: every word must match, the last as a prefix."""
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_conversations(text, limit=20):
+    """Best-ranked message and conversation-title matches for text.
+
+    Returns {"titles": [...], "messages": [...]}; snippets and titles carry
+    HIGHLIGHT_START/END around the matched terms.
+    """
+    query = fts_query(text)
+    if query is None:
+        return {"titles": [], "messages": []}
+    with connection() as conn:
+        titles = conn.execute(
+            f"""SELECT rowid AS conversation_id,
+                       highlight(conversations_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}') AS title
+                FROM conversations_fts WHERE conversations_fts MATCH ?
+                ORDER BY rank LIMIT 5""",
+            (query,),
+        ).fetchall()
+        messages = conn.execute(
+            f"""SELECT m.id AS message_id, m.conversation_id, m.role, c.title,
+                       snippet(messages_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 16) AS snippet
+                FROM messages_fts
+                JOIN messages m ON m.id = messages_fts.rowid
+                JOIN conversations c ON c.id = m.conversation_id
+                WHERE messages_fts MATCH ?
+                ORDER BY rank LIMIT ?""",
+            (query, limit),
+        ).fetchall()
+    return {"titles": [dict(r) for r in titles], "messages": [dict(r) for r in messages]}
 
 
 def delete_conversation(conversation_id):
-    conn = get_db()
-    conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
-    conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+        conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
 
 
 # ── College match helpers ────────────────────────────────────────
 
 def get_college_matches():
-    conn = get_db()
-    rows = conn.execute("SELECT * FROM college_matches ORDER BY tier, fit_score DESC").fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("SELECT * FROM college_matches ORDER BY tier, fit_score DESC").fetchall()
     return [dict(r) for r in rows]
 
 
 def save_college_matches(matches):
     """Replace all matches with a new list of dicts."""
-    conn = get_db()
-    conn.execute("DELETE FROM college_matches")
-    for m in matches:
-        conn.execute(
+    with transaction() as conn:
+        conn.execute("DELETE FROM college_matches")
+        conn.executemany(
             "INSERT INTO college_matches (name, tier, reasoning, fit_score, location, size) VALUES (?, ?, ?, ?, ?, ?)",
-            (m["name"], m["tier"], m.get("reasoning", ""), m.get("fit_score", 0),
-             m.get("location", ""), m.get("size", "")),
+            [(m["name"], m["tier"], m.get("reasoning", ""), m.get("fit_score", 0),
+              m.get("location", ""), m.get("size", "")) for m in matches],
         )
-    conn.commit()
-    conn.close()
 
 
 def delete_all_matches():
-    conn = get_db()
-    conn.execute("DELETE FROM college_matches")
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM college_matches")
 
 
 # ── Application tracker helpers ──────────────────────────────────
 
 def get_applications():
-    conn = get_db()
-    rows = conn.execute("SELECT * FROM applications ORDER BY deadline, college_name").fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("SELECT * FROM applications ORDER BY deadline, college_name").fetchall()
     return [dict(r) for r in rows]
 
 
 def add_application(college_name, deadline=None, app_type="Regular Decision"):
-    conn = get_db()
-    conn.execute(
-        "INSERT INTO applications (college_name, deadline, app_type) VALUES (?, ?, ?)",
-        (college_name, deadline, app_type),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO applications (college_name, deadline, app_type) VALUES (?, ?, ?)",
+            (college_name, deadline, app_type),
+        )
 
 
 def update_application(app_id, **kwargs):
-    conn = get_db()
     sets = ", ".join(f"{k} = ?" for k in kwargs)
     vals = list(kwargs.values())
-    conn.execute(
-        f"UPDATE applications SET {sets}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-        vals + [app_id],
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(
+            f"UPDATE applications SET {sets}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            vals + [app_id],
+        )
+
+
+def update_applications(changes):
+    """Apply [(app_id, {field: value}), ...] in a single transaction.
+
+    Returns one entry per change: None if it was applied, else an error
+    message. A failing change doesn't stop the others.
+    """
+    outcomes = []
+    with transaction() as conn:
+        for app_id, fields in changes:
+            if not fields:
+                outcomes.append(None)
+                continue
+            sets = ", ".join(f"{k} = ?" for k in fields)
+            try:
+                cur = conn.execute(
+                    f"UPDATE applications SET {sets}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    list(fields.values()) + [app_id],
+                )
+            except sqlite3.Error as e:
+                outcomes.append(str(e))
+                continue
+            outcomes.append(None if cur.rowcount else "Application not found")
+    return outcomes
 
 
 def delete_application(app_id):
-    conn = get_db()
-    conn.execute("DELETE FROM applications WHERE id = ?", (app_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM applications WHERE id = ?", (app_id,))
+
+
+# ── Result cache ─────────────────────────────────────────────────
+
+def cache_get(namespace, key, ttl=None):
+    """Return the cached JSON value, or None if missing or older than ttl seconds."""
+    now = time.time()
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT value, created_at FROM kv_cache WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        if ttl is not None and now - row["created_at"] > ttl:
+            conn.execute("DELETE FROM kv_cache WHERE namespace = ? AND key = ?", (namespace, key))
+            return None
+        conn.execute(
+            "UPDATE kv_cache SET last_used = ? WHERE namespace = ? AND key = ?",
+            (now, namespace, key),
+        )
+    return json.loads(row["value"])
+
+
+def cache_put(namespace, key, value, max_entries=None):
+    """Store a JSON-serializable value, evicting least recently used entries past max_entries."""
+    now = time.time()
+    with transaction() as conn:
+        conn.execute(
+            """INSERT INTO kv_cache (namespace, key, value, created_at, last_used)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (namespace, key) DO UPDATE SET
+                   value = excluded.value, created_at = excluded.created_at, last_used = excluded.last_used""",
+            (namespace, key, json.dumps(value), now, now),
+        )
+        if max_entries is not None:
+            conn.execute(
+                """DELETE FROM kv_cache WHERE namespace = ? AND key NOT IN (
+                       SELECT key FROM kv_cache WHERE namespace = ? ORDER BY last_used DESC LIMIT ?
+                   )""",
+                (namespace, namespace, max_entries),
+            )
+
+
+def cache_clear(namespace):
+    with transaction() as conn:
+        conn.execute("DELETE FROM kv_cache WHERE namespace = ?", (namespace,))
+
+
+# ── Job helpers ──────────────────────────────────────────────────
+
+def _job_row(row):
+    job = dict(row)
+    for field in ("progress", "result"):
+        job[field] = json.loads(job[field]) if job[field] else None
+    return job
+
+
+def create_job(job_id, kind):
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, heartbeat_at) VALUES (?, ?, ?)",
+            (job_id, kind, time.time()),
+        )
+
+
+def get_job(job_id):
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _job_row(row) if row else None
+
+
+def get_jobs(kind=None, limit=20):
+    sql = "SELECT * FROM jobs"
+    params = []
+    if kind:
+        sql += " WHERE kind = ?"
+        params.append(kind)
+    sql += " ORDER BY created_at DESC, rowid DESC LIMIT ?"
+    with connection() as conn:
+        rows = conn.execute(sql, params + [limit]).fetchall()
+    return [_job_row(r) for r in rows]
+
+
+def update_job(job_id, **kwargs):
+    """Update job fields; progress and result are stored as JSON."""
+    for field in ("progress", "result"):
+        if field in kwargs and kwargs[field] is not None:
+            kwargs[field] = json.dumps(kwargs[field])
+    kwargs["heartbeat_at"] = time.time()
+    sets = ", ".join(f"{k} = ?" for k in kwargs)
+    vals = list(kwargs.values())
+    with transaction() as conn:
+        conn.execute(
+            f"UPDATE jobs SET {sets}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            vals + [job_id],
+        )
+
+
+def delete_jobs(kind_pattern, statuses):
+    """Delete jobs whose kind matches a LIKE pattern and whose status is one of statuses."""
+    marks = ", ".join("?" for _ in statuses)
+    with transaction() as conn:
+        conn.execute(
+            f"DELETE FROM jobs WHERE kind LIKE ? AND status IN ({marks})",
+            [kind_pattern, *statuses],
+        )
+
+
+def touch_jobs(job_ids):
+    """Refresh the heartbeat of jobs this process is still working on."""
+    now = time.time()
+    with transaction() as conn:
+        conn.executemany("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", [(now, j) for j in job_ids])
 
 
 # ── Stats for dashboard ─────────────────────────────────────────
 
-def get_dashboard_stats():
-    profile = get_profile()
-    courses = get_courses()
-    gpa = calc_gpa(courses)
-    matches = get_college_matches()
-    apps = get_applications()
-
-    # Profile completion
-    profile_fields = [
-        "name", "high_school", "grad_year", "major_interests",
-        "extracurriculars", "location_pref", "size_pref", "budget",
-    ]
-    filled = sum(1 for f in profile_fields if profile.get(f))
-    profile_pct = int(filled / len(profile_fields) * 100)
+PROFILE_COMPLETION_FIELDS = [
+    "name", "high_school", "grad_year", "major_interests",
+    "extracurriculars", "location_pref", "size_pref", "budget",
+]
 
-    # Upcoming deadlines (next 3)
-    upcoming = [a for a in apps if a.get("deadline")]
-    upcoming.sort(key=lambda a: a["deadline"])
-    upcoming = upcoming[:3]
+
+_DASHBOARD_SQL = f"""
+    SELECT p.sat_score, p.act_score,
+           ({" + ".join(f"(COALESCE({f}, '') NOT IN ('', 0))" for f in PROFILE_COMPLETION_FIELDS)}) AS filled,
+           t.course_count, t.credits, t.uw_points, t.w_points,
+           (SELECT COUNT(*) FROM applications) AS app_count
+    FROM profile p,
+         (SELECT COALESCE(SUM(course_count), 0) AS course_count,
+                 SUM(credits) AS credits, SUM(uw_points) AS uw_points, SUM(w_points) AS w_points
+          FROM gpa_totals) t
+    WHERE p.id = 1
+"""
+
+
+def get_dashboard_stats():
+    """Dashboard numbers from running totals and indexed queries, not full table reads."""
+    with connection() as conn:
+        row = conn.execute(_DASHBOARD_SQL).fetchone()
+        tiers = dict(conn.execute(
+            "SELECT tier, COUNT(*) FROM college_matches GROUP BY tier"
+        ).fetchall())
+        upcoming = conn.execute(
+            "SELECT * FROM applications WHERE deadline > '' ORDER BY deadline LIMIT 3"
+        ).fetchall()
 
     return {
-        "gpa": gpa,
-        "sat_score": profile.get("sat_score"),
-        "act_score": profile.get("act_score"),
-        "course_count": len(courses),
-        "profile_pct": profile_pct,
-        "match_count": len(matches),
-        "reach_count": sum(1 for m in matches if m["tier"] == "reach"),
-        "match_tier_count": sum(1 for m in matches if m["tier"] == "match"),
-        "safety_count": sum(1 for m in matches if m["tier"] == "safety"),
-        "app_count": len(apps),
-        "upcoming_deadlines": upcoming,
+        "gpa": _gpa(row["credits"], row["uw_points"], row["w_points"]),
+        "sat_score": row["sat_score"],
+        "act_score": row["act_score"],
+        "course_count": row["course_count"],
+        "profile_pct": int(row["filled"] / len(PROFILE_COMPLETION_FIELDS) * 100),
+        "match_count": sum(tiers.values()),
+        "reach_count": tiers.get("reach", 0),
+        "match_tier_count": tiers.get("match", 0),
+        "safety_count": tiers.get("safety", 0),
+        "app_count": row["app_count"],
+        "upcoming_deadlines": [dict(a) for a in upcoming],
     }
 
 
 if __name__ == "__main__":
     init_db()
-    print("Database initialized.")
+    print(f"Database initialized (schema v{SCHEMA_VERSION}).")
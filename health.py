@@ -0,0 +1,156 @@
+"""Ollama health: a background prober and a circuit breaker.
+
+A daemon thread pings Ollama every few seconds and caches the result, so
+status checks (the LLM banner, /api/llm-status) never touch the network.
+Model calls run inside guard(), which feeds a circuit breaker:
+
+- closed: calls go through; FAILURE_THRESHOLD backend failures in a row
+  (or a failed probe) open it.
+- open: calls fail immediately with Unavailable instead of each waiting out
+  a connection timeout. The prober keeps checking.
+- half_open: a probe succeeded; calls go through again, and the first one
+  decides whether the breaker closes or opens again.
+"""
+import threading
+import time
+
+import httpx
+import ollama
+
+import metrics
+
+PROBE_INTERVAL = 30  # seconds between probes while healthy
+PROBE_INTERVAL_DOWN = 5  # ...and while the backend is down
+PROBE_TIMEOUT = 3
+FAILURE_THRESHOLD = 3
+
+_lock = threading.Lock()
+_state = "closed"
+_failures = 0
+_last_error = None
+_checked_at = None
+_opened_at = None
+_prober = None
+_wake = threading.Event()
+
+
+class Unavailable(Exception):
+    """Raised instead of calling Ollama while the breaker is open."""
+
+    def __init__(self, retry_after=PROBE_INTERVAL_DOWN):
+        super().__init__("The AI model is not reachable right now. Is Ollama running?")
+        self.retry_after = retry_after
+
+
+def _is_backend_failure(e):
+    """Errors that say Ollama itself is down or broken, not that a request was bad."""
+    if isinstance(e, (ConnectionError, httpx.TransportError)):
+        return True
+    return isinstance(e, ollama.ResponseError) and e.status_code >= 500
+
+
+def _open(error):
+    global _state, _opened_at, _last_error
+    if _state != "open":
+        _opened_at = time.monotonic()
+    _state = "open"
+    _last_error = error
+    _wake.set()  # switch the prober to the faster down-interval
+
+
+def record_success():
+    global _state, _failures, _last_error
+    with _lock:
+        _state = "closed"
+        _failures = 0
+        _last_error = None
+
+
+def record_failure(e):
+    global _failures
+    if not _is_backend_failure(e):
+        return
+    with _lock:
+        _failures += 1
+        if _state == "half_open" or _failures >= FAILURE_THRESHOLD:
+            _open(str(e))
+
+
+def check():
+    """Raise Unavailable if the breaker is open. Starts the prober on first use."""
+    _ensure_prober()
+    if _state == "open":
+        raise Unavailable()
+
+
+class guard:
+    """Context manager around a model call: fails fast while open, records the outcome."""
+
+    def __enter__(self):
+        check()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None:
+            record_success()
+        elif isinstance(exc, Exception):
+            record_failure(exc)
+        return False
+
+
+def is_available():
+    _ensure_prober()
+    return _state != "open"
+
+
+def status():
+    """Cached health: no network round trip."""
+    _ensure_prober()
+    with _lock:
+        return {
+            "available": _state != "open",
+            "state": _state,
+            "error": _last_error,
+            "checked_seconds_ago": round(time.monotonic() - _checked_at, 1) if _checked_at else None,
+            "open_for": round(time.monotonic() - _opened_at, 1) if _state == "open" else None,
+        }
+
+
+def _probe():
+    global _state, _checked_at
+    try:
+        ollama.Client(timeout=PROBE_TIMEOUT).list()
+    except Exception as e:
+        with _lock:
+            _checked_at = time.monotonic()
+            _open(str(e) or e.__class__.__name__)
+        return
+    with _lock:
+        _checked_at = time.monotonic()
+        if _state == "open":
+            _state = "half_open"
+
+
+def _run():
+    while True:
+        _probe()
+        _wake.clear()
+        _wake.wait(PROBE_INTERVAL_DOWN if _state == "open" else PROBE_INTERVAL)
+
+
+def _ensure_prober():
+    global _prober
+    if _prober is not None:
+        return
+    with _lock:
+        if _prober is not None:
+            return
+        _prober = threading.Thread(target=_run, name="llm-health", daemon=True)
+    _prober.start()
+
+
+@metrics.collector
+def _metrics():
+    return ["# HELP college_hub_llm_up Whether the circuit breaker lets model calls through.",
+            "# TYPE college_hub_llm_up gauge",
+            f"college_hub_llm_up {int(_state != 'open')}"]
@@ -0,0 +1,323 @@
+"""Background jobs for long-running LLM work.
+
+Routes submit a job and return its id straight away; a small worker pool runs
+it while the request thread goes back to serving. Queued jobs start in the
+priority order of their scheduler class (transcript parsing before match
+generation and chat summaries) and count toward that class's queue limit. Job state lives in the
+student's database (the jobs table), so status and results survive a page
+reload, and live progress events are kept in memory for streaming.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+import uuid
+
+import db
+import metrics
+import scheduler
+
+WORKERS = 2
+RESERVED_FOR_PARSE = 1  # workers that match/summary jobs leave free, so an upload never waits behind them
+HEARTBEAT_SECONDS = 10
+STALE_AFTER = 3 * HEARTBEAT_SECONDS  # queued/running jobs without a heartbeat are orphans
+RETAIN_SECONDS = 600  # keep finished jobs' events in memory for late subscribers
+
+FINISHED = ("done", "failed", "cancelled")
+
+# job kind (without any ":<id>" suffix) -> scheduler class of its model calls
+CLASSES = {
+    "transcript_parse": "parse",
+    "college_matches": "match",
+    "chat_summary": "summary",
+}
+
+_queue = []  # heap of (priority, seq, job, run)
+_queue_cond = threading.Condition()
+_seq = itertools.count()
+_workers = []
+_background_running = 0  # match/summary jobs holding a worker
+_live = {}  # job id -> Job, for jobs started by this process
+_live_lock = threading.Lock()
+_heartbeat = None
+
+
+class Cancelled(Exception):
+    """Raised inside a job function once the job has been cancelled."""
+
+
+class Job:
+    """Handle passed to job functions for reporting progress and checking cancellation."""
+
+    def __init__(self, job_id, kind):
+        self.id = job_id
+        self.kind = kind
+        self.llm_class = CLASSES[kind.partition(":")[0]]
+        self.db_path = db.current_db()
+        self.events = []
+        self.finished_at = None
+        self._cancelled = threading.Event()
+        self._cond = threading.Condition()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise Cancelled()
+
+    def progress(self, event):
+        """Publish a progress event to subscribers and record it as the job's latest."""
+        self._publish(event)
+        db.update_job(self.id, progress=event)
+
+    def _publish(self, event):
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def _finish(self, status, result=None, error=None):
+        db.update_job(self.id, status=status, result=result, error=error)
+        self.finished_at = time.time()
+        self._publish({"event": "status", "id": self.id, "status": status,
+                       "result": result, "error": error})
+
+
+def submit(kind, fn, *args):
+    """Queue fn(job, *args) to run in the background and return the new job's id.
+
+    The job runs against the same student database as the caller. Raises
+    scheduler.Overloaded when its class's queue is full.
+    """
+    _prune()
+    job = Job(uuid.uuid4().hex, kind)
+    scheduler.reserve(job.llm_class)
+    try:
+        db.create_job(job.id, kind)
+    except Exception:
+        scheduler.unreserve(job.llm_class)
+        raise
+    with _live_lock:
+        _live[job.id] = job
+    _start_heartbeat()
+    _start_workers()
+    run = contextvars.copy_context().run
+    with _queue_cond:
+        heapq.heappush(_queue, (scheduler.CLASSES[job.llm_class][0], next(_seq), job,
+                                lambda: run(_run, job, fn, args)))
+        _queue_cond.notify_all()
+    return job.id
+
+
+def _can_start(job):
+    """Whether a worker may take job now. Called with _queue_cond held."""
+    return job.llm_class == "parse" or _background_running < max(1, WORKERS - RESERVED_FOR_PARSE)
+
+
+def _work():
+    global _background_running
+    while True:
+        with _queue_cond:
+            while not _queue or not _can_start(_queue[0][2]):
+                _queue_cond.wait()
+            _, _, job, run = heapq.heappop(_queue)
+            background = job.llm_class != "parse"
+            _background_running += background
+        scheduler.unreserve(job.llm_class)
+        try:
+            run()
+        except Exception:
+            pass  # _run records job failures; keep the worker alive regardless
+        finally:
+            with _queue_cond:
+                _background_running -= background
+                _queue_cond.notify_all()
+
+
+def _start_workers():
+    with _queue_cond:
+        while len(_workers) < WORKERS:
+            worker = threading.Thread(target=_work, name=f"job-{len(_workers)}", daemon=True)
+            _workers.append(worker)
+            worker.start()
+
+
+def _run(job, fn, args):
+    if job.cancelled:
+        job._finish("cancelled")
+        return
+    db.update_job(job.id, status="running")
+    started = time.perf_counter()
+    try:
+        result = fn(job, *args)
+    except Cancelled:
+        status = "cancelled"
+        job._finish(status)
+    except Exception as e:
+        status = "failed"
+        job._finish(status, error=str(e) or e.__class__.__name__)
+    else:
+        status = "cancelled" if job.cancelled else "done"
+        job._finish(status, result=result if status == "done" else None)
+    # Kinds may be scoped to one record ("chat_summary:12"); label by the base kind.
+    metrics.job_seconds.observe(time.perf_counter() - started, job.kind.partition(":")[0], status)
+
+
+def cancel(job_id):
+    """Ask a job to stop. Jobs stop at their next check; queued ones never start."""
+    with _live_lock:
+        job = _live.get(job_id)
+    if job is None or job.finished_at is not None:
+        return False
+    job._cancelled.set()
+    return True
+
+
+def get(job_id):
+    """Current job record, with orphans (lost to a restart or crash) marked failed."""
+    job = db.get_job(job_id)
+    if job and job["status"] not in FINISHED and time.time() - (job["heartbeat_at"] or 0) > STALE_AFTER:
+        db.update_job(job_id, status="failed", error="Interrupted before it finished")
+        job = db.get_job(job_id)
+    return job
+
+
+def active(kind):
+    """Id of the newest unfinished job of this kind, if any."""
+    for job in db.get_jobs(kind, limit=1):
+        if job["status"] not in FINISHED and get(job["id"])["status"] not in FINISHED:
+            return job["id"]
+    return None
+
+
+def forget(kind_pattern):
+    """Delete finished jobs whose kind matches a LIKE pattern, for kinds nobody follows."""
+    db.delete_jobs(kind_pattern, FINISHED)
+
+
+def iter_events(job_id, heartbeat=HEARTBEAT_SECONDS):
+    """Yield a job's progress events until it finishes, then its final status event.
+
+    Yields None periodically while nothing happens, so callers can send
+    keep-alives. Jobs running in another process are followed by polling.
+    """
+    with _live_lock:
+        job = _live.get(job_id)
+    if job is None:
+        yield from _poll_events(job_id, heartbeat)
+        return
+
+    seen = 0
+    while True:
+        with job._cond:
+            if len(job.events) <= seen:
+                job._cond.wait(timeout=heartbeat)
+            new = job.events[seen:]
+        seen += len(new)
+        if not new:
+            yield None
+        for event in new:
+            yield event
+            if event["event"] == "status":
+                return
+
+
+async def aiter_events(job_id, heartbeat=HEARTBEAT_SECONDS, interval=0.25):
+    """Async counterpart of iter_events, for the asyncio server (asgi.py).
+
+    Polls instead of waiting on the job's condition, so a subscriber costs a
+    coroutine rather than a blocked thread.
+    """
+    with _live_lock:
+        job = _live.get(job_id)
+    if job is None:
+        # Started by another process: follow the stored record.
+        interval = max(interval, 1.0)
+    seen = 0
+    last_progress = None
+    idle = 0.0
+    while True:
+        if job is not None:
+            with job._cond:
+                new = job.events[seen:]
+            seen += len(new)
+        else:
+            record = await asyncio.to_thread(get, job_id)
+            if record is None:
+                return
+            if record["status"] in FINISHED:
+                new = [{"event": "status", "id": job_id, "status": record["status"],
+                        "result": record["result"], "error": record["error"]}]
+            elif record["progress"] is not None and record["progress"] != last_progress:
+                last_progress = record["progress"]
+                new = [last_progress]
+            else:
+                new = []
+        for event in new:
+            yield event
+            if event["event"] == "status":
+                return
+        if new:
+            idle = 0.0
+        elif idle >= heartbeat:
+            idle = 0.0
+            yield None
+        await asyncio.sleep(interval)
+        idle += interval
+
+
+def _poll_events(job_id, heartbeat, interval=1.0):
+    last_progress = None
+    idle = 0.0
+    while True:
+        job = get(job_id)
+        if job is None:
+            return
+        if job["status"] in FINISHED:
+            yield {"event": "status", "id": job_id, "status": job["status"],
+                   "result": job["result"], "error": job["error"]}
+            return
+        if job["progress"] is not None and job["progress"] != last_progress:
+            last_progress = job["progress"]
+            idle = 0.0
+            yield last_progress
+        elif idle >= heartbeat:
+            idle = 0.0
+            yield None
+        time.sleep(interval)
+        idle += interval
+
+
+def _prune():
+    cutoff = time.time() - RETAIN_SECONDS
+    with _live_lock:
+        for job_id in [j for j, job in _live.items() if job.finished_at and job.finished_at < cutoff]:
+            del _live[job_id]
+
+
+def _start_heartbeat():
+    global _heartbeat
+    with _live_lock:
+        if _heartbeat is not None:
+            return
+        _heartbeat = threading.Thread(target=_beat, name="job-heartbeat", daemon=True)
+    _heartbeat.start()
+
+
+def _beat():
+    while True:
+        time.sleep(HEARTBEAT_SECONDS)
+        with _live_lock:
+            active = [job for job in _live.values() if job.finished_at is None]
+        by_db = {}
+        for job in active:
+            by_db.setdefault(job.db_path, []).append(job.id)
+        for path, job_ids in by_db.items():
+            try:
+                with db.using(path):
+                    db.touch_jobs(job_ids)
+            except Exception:
+                pass  # a missed beat only matters after several in a row
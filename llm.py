@@ -1,7 +1,17 @@
+import hashlib
 import json
+import os
+import threading
+from collections import OrderedDict
+
 import ollama
 
+import health
+import metrics
+import scheduler
+
 MODEL = "llama3.1:8b"
+KEEP_ALIVE = "30m"  # keep the model (and its prompt-prefix cache) loaded between turns
 
 SAGE_SYSTEM = """You are Sage, a warm, knowledgeable college counselor helping a high school student explore their college options. Your approach:
 
@@ -17,11 +27,8 @@ You have access to the student's academic profile and should reference it natura
 
 
 def check_available():
-    try:
-        ollama.list()
-        return True
-    except Exception:
-        return False
+    """Cached backend health (see health.py); never blocks on the network."""
+    return health.is_available()
 
 
 def _build_student_context(profile, courses, gpa):
@@ -60,22 +67,149 @@ def _build_student_context(profile, courses, gpa):
     return "\n".join(parts)
 
 
-def stream_chat(profile, courses, gpa, history):
-    """Yield tokens from Ollama streaming response."""
-    context = _build_student_context(profile, courses, gpa)
+# Rendered contexts keyed by student, tagged with the data version they were
+# built from. Reusing the exact string keeps the system prompt byte-identical
+# across turns, so Ollama can reuse its KV cache for the whole prefix.
+CONTEXT_CACHE_SIZE = 256
+
+_context_cache = OrderedDict()
+_context_lock = threading.Lock()
+
+
+def student_context(cache_key, version, load):
+    """Cached student context for cache_key, rebuilt only when version changes.
+
+    load() is called on a miss and must return (profile, courses, gpa).
+    """
+    with _context_lock:
+        hit = _context_cache.get(cache_key)
+        if hit and hit[0] == version:
+            _context_cache.move_to_end(cache_key)
+            return hit[1]
+    context = _build_student_context(*load())
+    with _context_lock:
+        _context_cache[cache_key] = (version, context)
+        _context_cache.move_to_end(cache_key)
+        while len(_context_cache) > CONTEXT_CACHE_SIZE:
+            _context_cache.popitem(last=False)
+    return context
+
+
+# ── Chat history budget ──────────────────────────────────────────
+# Only the newest turns are sent verbatim; older ones are folded into a
+# rolling summary stored with the conversation, so the prompt stays roughly
+# the same size however long the session runs.
+HISTORY_TOKEN_BUDGET = int(os.environ.get("COLLEGE_HUB_HISTORY_TOKENS", "3000"))
+HISTORY_TURNS = int(os.environ.get("COLLEGE_HUB_HISTORY_TURNS", "6"))
+
+SUMMARY_SYSTEM = """You keep running notes on a conversation between a high school student and their college counselor, Sage.
+
+Merge the new exchanges into the existing notes. Keep everything useful for continuing the conversation: the student's interests, goals, preferences, concerns, schools discussed and how they felt about them, decisions made, and open questions. Drop pleasantries. Write compact bullet points, at most 250 words in total. Respond with the updated notes only."""
 
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def fit_history(messages, summary="", budget=None, turns=None):
+    """Split messages into (older, recent) so recent fits the token budget.
+
+    recent holds at most the last `turns` user/assistant turns, newest kept
+    first, and always includes the latest message; the summary's share of the
+    budget is taken off the top. older is what should be folded into the summary.
+    """
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    turns = HISTORY_TURNS if turns is None else turns
+    remaining = budget - estimate_tokens(summary)
+    start = len(messages)
+    while start > 0 and len(messages) - start < 2 * turns:
+        cost = estimate_tokens(messages[start - 1]["content"])
+        if cost > remaining and start < len(messages):
+            break
+        remaining -= cost
+        start -= 1
+    return messages[:start], messages[start:]
+
+
+def summarize_history(summary, messages):
+    """Fold messages into the rolling conversation summary and return the new one."""
+    transcript = "\n\n".join(
+        f"{'Student' if m['role'] == 'user' else 'Sage'}: {m['content']}"
+        for m in messages if m["role"] in ("user", "assistant")
+    )
+    with health.guard(), scheduler.slot("summary"), metrics.llm_span("summary") as span:
+        response = ollama.chat(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": SUMMARY_SYSTEM},
+                {"role": "user", "content": f"## Existing notes\n{summary or '(none yet)'}\n\n"
+                                            f"## New exchanges\n{transcript}"},
+            ],
+            keep_alive=KEEP_ALIVE,
+        )
+        span.finish(response)
+    return response["message"]["content"].strip()
+
+
+def _chat_messages(context, history, summary):
     messages = [
         {"role": "system", "content": SAGE_SYSTEM + "\n\n" + context},
     ]
+    # A separate message keeps the system prompt above byte-identical while
+    # the summary changes, so its KV cache can still be reused.
+    if summary:
+        messages.append({"role": "system", "content": "## Earlier in this conversation\n" + summary})
     for msg in history:
-        if msg["role"] in ("user", "assistant"):
+        if msg["role"] in ("user", "assistant") and msg["content"]:
             messages.append({"role": msg["role"], "content": msg["content"]})
+    return messages
+
+
+def stream_chat(context, history, summary=""):
+    """Yield tokens from Ollama streaming response.
 
-    stream = ollama.chat(model=MODEL, messages=messages, stream=True)
+    history should already fit the budget (see fit_history); summary covers
+    whatever came before it.
+    """
+    messages = _chat_messages(context, history, summary)
+    with health.guard(), scheduler.slot("chat"), metrics.llm_span("chat") as span:
+        stream = ollama.chat(model=MODEL, messages=messages, stream=True, keep_alive=KEEP_ALIVE)
+        yield from _tokens(stream, span)
+
+
+def _tokens(stream, span):
+    """Content pieces of a streamed chat response, timed on span."""
     for chunk in stream:
         token = chunk.get("message", {}).get("content", "")
         if token:
+            span.token()
             yield token
+        if chunk.get("done"):
+            span.finish(chunk)
+
+
+_async_client = None
+
+
+async def astream_chat(context, history, summary=""):
+    """Async counterpart of stream_chat, for the asyncio server (asgi.py)."""
+    global _async_client
+    if _async_client is None:
+        _async_client = ollama.AsyncClient()
+    messages = _chat_messages(context, history, summary)
+    with health.guard():
+        async with scheduler.aslot("chat"):
+            with metrics.llm_span("chat") as span:
+                stream = await _async_client.chat(model=MODEL, messages=messages, stream=True,
+                                                  keep_alive=KEEP_ALIVE)
+                async for chunk in stream:
+                    token = chunk.get("message", {}).get("content", "")
+                    if token:
+                        span.token()
+                        yield token
+                    if chunk.get("done"):
+                        span.finish(chunk)
 
 
 MATCH_SYSTEM = """You are a college admissions expert. Based on the student profile below, generate a list of 12-15 college recommendations divided into three tiers:
@@ -92,47 +226,132 @@ For each school, provide:
 - location: City, State
 - size: "Small", "Medium", or "Large"
 
-IMPORTANT: Respond with ONLY valid JSON — an array of objects. No markdown, no explanation outside the JSON."""
+IMPORTANT: Respond with ONLY a JSON object of the form {"colleges": [...]}. No markdown, no explanation outside the JSON."""
 
+# Passed as Ollama's `format`, which constrains generation to this shape.
+MATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "colleges": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "tier": {"type": "string", "enum": ["reach", "match", "safety"]},
+                    "reasoning": {"type": "string"},
+                    "fit_score": {"type": "integer", "minimum": 1, "maximum": 100},
+                    "location": {"type": "string"},
+                    "size": {"type": "string", "enum": ["Small", "Medium", "Large"]},
+                },
+                "required": ["name", "tier", "reasoning", "fit_score", "location", "size"],
+            },
+        },
+    },
+    "required": ["colleges"],
+}
 
-def generate_college_matches(profile, courses, gpa, chat_insights=""):
-    """Generate college recommendations using Ollama."""
-    context = _build_student_context(profile, courses, gpa)
+# Bump when the match prompt or post-processing changes, to invalidate cached results.
+MATCH_PROMPT_VERSION = 2
+
+
+def match_cache_key(context, chat_insights=""):
+    """Hash of every input that determines generate_college_matches() output."""
+    payload = json.dumps([MODEL, MATCH_PROMPT_VERSION, MATCH_SYSTEM, context, chat_insights])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def iter_array_objects(chunks):
+    """Yield each JSON object that is an array element, as soon as it closes.
+
+    chunks is text arriving in arbitrary pieces (a token stream). Objects
+    nested inside an element come out as part of it, not on their own, and an
+    element that fails to parse is skipped so one bad entry doesn't lose the
+    rest.
+    """
+    stack = []  # open containers, "{" or "["
+    in_string = escaped = False
+    element = None  # characters of the element being read
+    element_depth = 0
+    for chunk in chunks:
+        for ch in chunk:
+            if element is not None:
+                element.append(ch)
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch in "{[":
+                if ch == "{" and element is None and stack and stack[-1] == "[":
+                    element = ["{"]
+                    element_depth = len(stack)
+                stack.append(ch)
+            elif ch in "}]" and stack:
+                stack.pop()
+                if element is not None and len(stack) == element_depth:
+                    text, element = "".join(element), None
+                    try:
+                        yield json.loads(text)
+                    except ValueError:
+                        pass
+
+
+def _normalize_match(m):
+    """A validated college match, or None if m isn't usable."""
+    if not isinstance(m, dict):
+        return None
+    name = str(m.get("name") or "").strip()
+    if not name:
+        return None
+    try:
+        fit_score = int(m.get("fit_score", 50))
+    except (TypeError, ValueError):
+        fit_score = 50
+    tier = str(m.get("tier") or "").lower()
+    return {
+        "name": name,
+        "tier": tier if tier in ("reach", "match", "safety") else "match",
+        "reasoning": str(m.get("reasoning") or ""),
+        "fit_score": max(1, min(100, fit_score)),
+        "location": str(m.get("location") or ""),
+        "size": str(m.get("size") or ""),
+    }
+
+
+def stream_college_matches(context, chat_insights=""):
+    """Yield college recommendations one at a time as the model writes them.
+
+    The model is held to MATCH_SCHEMA and its output parsed as it streams,
+    so each college arrives as soon as its object closes and everything
+    before a malformed tail is kept.
+    """
     if chat_insights:
         context += f"\n\n## Insights from Counselor Interview\n{chat_insights}"
 
-    response = ollama.chat(
-        model=MODEL,
-        messages=[
-            {"role": "system", "content": MATCH_SYSTEM},
-            {"role": "user", "content": context + "\n\nGenerate college recommendations as JSON:"},
-        ],
-    )
+    seen = set()
+    with health.guard(), scheduler.slot("match"), metrics.llm_span("match") as span:
+        stream = ollama.chat(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": MATCH_SYSTEM},
+                {"role": "user", "content": context + "\n\nGenerate college recommendations as JSON:"},
+            ],
+            format=MATCH_SCHEMA,
+            stream=True,
+            keep_alive=KEEP_ALIVE,
+        )
+        for m in iter_array_objects(_tokens(stream, span)):
+            match = _normalize_match(m)
+            if match and match["name"].lower() not in seen:
+                seen.add(match["name"].lower())
+                yield match
 
-    text = response["message"]["content"].strip()
-
-    # Try to extract JSON from response
-    if text.startswith("```"):
-        lines = text.split("\n")
-        text = "\n".join(lines[1:-1])
-    if text.startswith("["):
-        matches = json.loads(text)
-    else:
-        # Find the JSON array in the response
-        start = text.index("[")
-        end = text.rindex("]") + 1
-        matches = json.loads(text[start:end])
-
-    # Validate and normalize
-    valid = []
-    for m in matches:
-        if "name" in m and "tier" in m:
-            valid.append({
-                "name": m["name"],
-                "tier": m["tier"] if m["tier"] in ("reach", "match", "safety") else "match",
-                "reasoning": m.get("reasoning", ""),
-                "fit_score": int(m.get("fit_score", 50)),
-                "location": m.get("location", ""),
-                "size": m.get("size", ""),
-            })
-    return valid
+
+def generate_college_matches(context, chat_insights=""):
+    """Generate college recommendations using Ollama."""
+    return list(stream_college_matches(context, chat_insights))
@@ -0,0 +1,216 @@
+"""In-process metrics, served in Prometheus text format at /metrics.
+
+Recording is a dict lookup and a few additions under a lock, so it costs
+next to nothing; all formatting happens only when /metrics is scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+RATE_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200)
+
+_lock = threading.Lock()
+_metrics = []
+_collectors = []
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = (f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+             for n, v in zip(names, values))
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        _metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts (+Inf last), sum, count]
+        _metrics.append(self)
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with _lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                le = _labels(self.labels + ("le",), labels + (bound,))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {count}")
+        return lines
+
+
+def collector(fn):
+    """Register fn() -> lines of exposition text, called at scrape time (for gauges)."""
+    _collectors.append(fn)
+    return fn
+
+
+def render():
+    with _lock:
+        lines = [line for metric in _metrics for line in metric.render()]
+    for fn in _collectors:
+        lines.extend(fn())
+    return "\n".join(lines) + "\n"
+
+
+# ── Requests ─────────────────────────────────────────────────────
+
+request_seconds = Histogram("college_hub_request_duration_seconds",
+                            "Time to serve a request, including streamed bodies.",
+                            ("method", "route", "status"))
+request_db_seconds = Histogram("college_hub_request_db_seconds",
+                               "Time spent in SQLite per request.", ("route",), DB_BUCKETS)
+
+# Per-request accumulator for DB time; db.py adds to it after each statement.
+_request_db = ContextVar("request_db", default=None)
+
+
+def begin_request():
+    """Start accumulating DB time for the request running in this context."""
+    acc = [0.0]
+    _request_db.set(acc)
+    return acc
+
+
+def add_db_time(seconds):
+    acc = _request_db.get()
+    if acc is not None:
+        acc[0] += seconds
+
+
+def observe_request(method, route, status, seconds, db_seconds):
+    request_seconds.observe(seconds, method, route or "unmatched", str(status))
+    request_db_seconds.observe(db_seconds, route or "unmatched")
+
+
+class InstrumentedWSGI:
+    """WSGI middleware timing each request until its body is fully sent.
+
+    The route label comes from environ["college_hub.route"], set by the app
+    once routing is done, so label cardinality stays bounded.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        acc = begin_request()
+        status = ["500"]
+
+        def capture(status_line, headers, exc_info=None):
+            status[0] = status_line.split(" ", 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        def done():
+            observe_request(environ["REQUEST_METHOD"], environ.get("college_hub.route"), status[0],
+                            time.perf_counter() - start, acc[0])
+
+        try:
+            body = self.wsgi_app(environ, capture)
+        except Exception:
+            done()
+            raise
+        return _ClosingBody(body, done)
+
+
+class _ClosingBody:
+    def __init__(self, body, callback):
+        self._body = body
+        self._callback = callback
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self):
+        try:
+            if hasattr(self._body, "close"):
+                self._body.close()
+        finally:
+            self._callback()
+
+
+# ── Model calls ──────────────────────────────────────────────────
+
+llm_queue_seconds = Histogram("college_hub_llm_queue_wait_seconds",
+                              "Time a model call waited for a scheduler slot.", ("kind",))
+llm_ttft_seconds = Histogram("college_hub_llm_time_to_first_token_seconds",
+                             "Time from sending a model call to its first token.", ("kind",))
+llm_call_seconds = Histogram("college_hub_llm_call_duration_seconds",
+                             "Total duration of a model call.", ("kind", "outcome"))
+llm_tokens_per_second = Histogram("college_hub_llm_tokens_per_second",
+                                  "Generation speed reported by Ollama.", ("kind",), RATE_BUCKETS)
+llm_prompt_tokens = Counter("college_hub_llm_prompt_tokens_total", "Prompt tokens evaluated.", ("kind",))
+llm_completion_tokens = Counter("college_hub_llm_completion_tokens_total", "Tokens generated.", ("kind",))
+
+job_seconds = Histogram("college_hub_job_duration_seconds",
+                        "Run time of background jobs.", ("kind", "status"))
+
+
+class llm_span:
+    """Times one model call: `with metrics.llm_span("chat") as span:`.
+
+    Streaming calls call span.token() as output arrives (the first call marks
+    time to first token); every call passes Ollama's final response or chunk
+    to span.finish() to record token counts.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self._first = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def token(self):
+        if self._first is None:
+            self._first = time.perf_counter()
+            llm_ttft_seconds.observe(self._first - self._start, self.kind)
+
+    def finish(self, response):
+        prompt = response.get("prompt_eval_count") or 0
+        completion = response.get("eval_count") or 0
+        eval_ns = response.get("eval_duration") or 0
+        llm_prompt_tokens.inc(self.kind, amount=prompt)
+        llm_completion_tokens.inc(self.kind, amount=completion)
+        if completion and eval_ns:
+            llm_tokens_per_second.observe(completion / (eval_ns / 1e9), self.kind)
+
+    def __exit__(self, exc_type, exc, tb):
+        outcome = "ok" if exc is None else "cancelled" if not isinstance(exc, Exception) else "error"
+        llm_call_seconds.observe(time.perf_counter() - self._start, self.kind, outcome)
+        return False
@@ -0,0 +1,230 @@
+"""Scheduler for model calls.
+
+Every call to Ollama holds a slot from here while it runs. At most
+CONCURRENCY calls run at once (match it to the backend's
+OLLAMA_NUM_PARALLEL); the rest wait in priority order: interactive chat,
+then transcript parsing, then background work (match generation, chat
+summaries). Each class has a queue-depth limit beyond which new calls are
+refused straight away with Overloaded, which routes turn into a 503 with
+Retry-After instead of piling more work onto a saturated backend.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import metrics
+
+CONCURRENCY = int(os.environ.get("COLLEGE_HUB_LLM_CONCURRENCY", "1"))
+
+# class -> (priority, max queued); lower priorities are served first
+CLASSES = {
+    "chat": (0, 64),
+    "parse": (1, 32),
+    "match": (2, 8),
+    "summary": (2, 8),
+}
+
+# With more than one slot, this many are kept for chat so a reply never
+# waits behind a minute-long match generation.
+RESERVED_FOR_CHAT = 1
+
+DEFAULT_RETRY_AFTER = 10  # seconds, until there are timings to estimate from
+
+_lock = threading.Lock()
+_queue = []  # heap of (priority, seq, waiter)
+_seq = itertools.count()
+_running = {kind: 0 for kind in CLASSES}
+_queued = {kind: 0 for kind in CLASSES}
+_reserved = {kind: 0 for kind in CLASSES}  # admitted work (queued jobs) not yet asking for a slot
+_stats = {kind: {"calls": 0, "rejected": 0, "wait_total": 0.0, "wait_max": 0.0, "busy_total": 0.0}
+          for kind in CLASSES}
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing when a class's queue is full."""
+
+    def __init__(self, kind, retry_after):
+        super().__init__(f"The AI model is busy right now. Please try again in {retry_after}s.")
+        self.kind = kind
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("kind", "notify", "granted", "abandoned", "enqueued_at")
+
+    def __init__(self, kind, notify):
+        self.kind = kind
+        self.notify = notify
+        self.granted = False
+        self.abandoned = False
+        self.enqueued_at = time.monotonic()
+
+
+def _background_limit():
+    return max(1, CONCURRENCY - RESERVED_FOR_CHAT)
+
+
+def _dispatch():
+    """Grant free slots to the best waiters. Called with _lock held."""
+    held_back = []
+    while _queue and sum(_running.values()) < CONCURRENCY:
+        entry = heapq.heappop(_queue)
+        waiter = entry[2]
+        if waiter.abandoned:
+            continue
+        if waiter.kind != "chat" and sum(_running.values()) - _running["chat"] >= _background_limit():
+            held_back.append(entry)
+            continue
+        _queued[waiter.kind] -= 1
+        _running[waiter.kind] += 1
+        waiter.granted = True
+        waiter.notify()
+    for entry in held_back:
+        heapq.heappush(_queue, entry)
+
+
+def _retry_after(kind):
+    stats = _stats[kind]
+    if not stats["calls"]:
+        return DEFAULT_RETRY_AFTER
+    mean = stats["busy_total"] / stats["calls"]
+    return min(120, max(1, math.ceil(mean * (_queued[kind] + _reserved[kind] + 1) / CONCURRENCY)))
+
+
+def _reject_if_full(kind):
+    if _queued[kind] + _reserved[kind] >= CLASSES[kind][1]:
+        _stats[kind]["rejected"] += 1
+        raise Overloaded(kind, _retry_after(kind))
+
+
+def check(kind):
+    """Raise Overloaded now if a call of this kind would be refused.
+
+    For routes that start streaming or hand off to a job before the model
+    call is made, so they can still answer with a plain 503.
+    """
+    with _lock:
+        _reject_if_full(kind)
+
+
+def reserve(kind):
+    """Hold a place in kind's queue for work that asks for slots later.
+
+    For background jobs waiting for a worker, so they count toward the
+    queue limit too. Raises Overloaded when the queue is full; call
+    unreserve() once the work starts.
+    """
+    with _lock:
+        _reject_if_full(kind)
+        _reserved[kind] += 1
+
+
+def unreserve(kind):
+    with _lock:
+        _reserved[kind] -= 1
+
+
+def _enqueue(kind, notify):
+    waiter = _Waiter(kind, notify)
+    with _lock:
+        _reject_if_full(kind)
+        _queued[kind] += 1
+        heapq.heappush(_queue, (CLASSES[kind][0], next(_seq), waiter))
+        _dispatch()
+    return waiter
+
+
+def _started(waiter):
+    waited = time.monotonic() - waiter.enqueued_at
+    with _lock:
+        stats = _stats[waiter.kind]
+        stats["calls"] += 1
+        stats["wait_total"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+    metrics.llm_queue_seconds.observe(waited, waiter.kind)
+    return time.monotonic()
+
+
+def _release(kind, started):
+    with _lock:
+        _running[kind] -= 1
+        _stats[kind]["busy_total"] += time.monotonic() - started
+        _dispatch()
+
+
+@contextmanager
+def slot(kind):
+    """Hold a model slot of the given class for the duration of the block."""
+    ready = threading.Event()
+    waiter = _enqueue(kind, ready.set)
+    ready.wait()
+    started = _started(waiter)
+    try:
+        yield
+    finally:
+        _release(kind, started)
+
+
+@asynccontextmanager
+async def aslot(kind):
+    """Async counterpart of slot(); waiting costs a coroutine, not a thread."""
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+
+    def notify():
+        loop.call_soon_threadsafe(lambda: ready.done() or ready.set_result(None))
+
+    waiter = _enqueue(kind, notify)
+    try:
+        await ready
+    except asyncio.CancelledError:
+        with _lock:
+            granted = waiter.granted
+            if not granted:
+                waiter.abandoned = True
+                _queued[kind] -= 1
+        if granted:
+            _release(kind, time.monotonic())
+        raise
+    started = _started(waiter)
+    try:
+        yield
+    finally:
+        _release(kind, started)
+
+
+def stats():
+    """Per-class queue depth, running calls and queue-wait figures."""
+    with _lock:
+        return {
+            kind: {
+                "queued": _queued[kind],
+                "reserved": _reserved[kind],
+                "running": _running[kind],
+                "calls": s["calls"],
+                "rejected": s["rejected"],
+                "wait_avg": round(s["wait_total"] / s["calls"], 3) if s["calls"] else 0.0,
+                "wait_max": round(s["wait_max"], 3),
+            }
+            for kind, s in _stats.items()
+        }
+
+
+@metrics.collector
+def _metrics():
+    current = stats()
+    lines = []
+    for name, key, kind_, help_ in (
+        ("college_hub_llm_queued", "queued", "gauge", "Model calls waiting for a slot."),
+        ("college_hub_llm_reserved", "reserved", "gauge", "Background jobs waiting for a worker."),
+        ("college_hub_llm_running", "running", "gauge", "Model calls holding a slot."),
+        ("college_hub_llm_rejected_total", "rejected", "counter", "Model calls refused as overloaded."),
+    ):
+        lines += [f"# HELP {name} {help_}", f"# TYPE {name} {kind_}"]
+        lines += [f'{name}{{kind="{kind}"}} {s[key]}' for kind, s in current.items()]
+    return lines
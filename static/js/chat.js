@@ -1,6 +1,11 @@
 let currentConversation = null;
 let isStreaming = false;
 
+// Messages load a page at a time, newest first; scrolling to the top loads older ones.
+let oldestMessageId = null;
+let hasOlderMessages = false;
+let loadingOlder = false;
+
 function setInputEnabled(enabled) {
     document.getElementById("chat-input").disabled = !enabled;
     document.getElementById("send-btn").disabled = !enabled;
@@ -11,22 +16,70 @@ function scrollToBottom() {
     container.scrollTop = container.scrollHeight;
 }
 
-function appendMessage(role, content) {
-    const container = document.getElementById("chat-messages");
-    document.getElementById("chat-empty").style.display = "none";
-
+function messageElement(role, content, id, complete = true) {
     const div = document.createElement("div");
     div.className = `message message-${role}`;
+    if (id) div.dataset.id = id;
     div.textContent = content;
+    if (!complete) {
+        // Saved mid-stream: the reply was cut off (or is still being written elsewhere).
+        div.classList.add("message-partial");
+        div.title = "This reply was cut off before it finished.";
+    }
+    return div;
+}
+
+function appendMessage(role, content, id, complete = true) {
+    const container = document.getElementById("chat-messages");
+    document.getElementById("chat-empty").style.display = "none";
+
+    const div = messageElement(role, content, id, complete);
     container.appendChild(div);
     scrollToBottom();
     return div;
 }
 
+function fetchMessages(id, before) {
+    const query = before ? `?before=${before}` : "";
+    return fetch(`/chat/${id}/messages${query}`).then(res => res.json());
+}
+
+async function loadOlderMessages() {
+    if (!hasOlderMessages || loadingOlder) return;
+    loadingOlder = true;
+    const id = currentConversation;
+    const page = await fetchMessages(id, oldestMessageId);
+    loadingOlder = false;
+    if (id !== currentConversation) return;
+
+    // Prepend without moving what the student is looking at.
+    const container = document.getElementById("chat-messages");
+    const anchor = container.querySelector(".message");
+    const fromBottom = container.scrollHeight - container.scrollTop;
+    const fragment = document.createDocumentFragment();
+    for (const msg of page.messages) {
+        if (msg.role !== "system") fragment.appendChild(messageElement(msg.role, msg.content, msg.id, msg.complete));
+    }
+    container.insertBefore(fragment, anchor);
+    container.scrollTop = container.scrollHeight - fromBottom;
+
+    if (page.messages.length) oldestMessageId = page.messages[0].id;
+    hasOlderMessages = page.has_more;
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+    const container = document.getElementById("chat-messages");
+    container.addEventListener("scroll", () => {
+        if (container.scrollTop < 80) loadOlderMessages();
+    });
+});
+
 async function newConversation() {
     const res = await fetch("/chat/new", { method: "POST" });
     const data = await res.json();
     currentConversation = data.id;
+    oldestMessageId = null;
+    hasOlderMessages = false;
 
     // Add to sidebar
     const list = document.getElementById("chat-list");
@@ -52,7 +105,7 @@ async function newConversation() {
     document.getElementById("chat-input").focus();
 }
 
-async function loadConversation(id) {
+async function loadConversation(id, messageId) {
     currentConversation = id;
 
     // Update active state
@@ -60,9 +113,12 @@ async function loadConversation(id) {
         el.classList.toggle("active", el.dataset.id == id);
     });
 
-    // Load messages
-    const res = await fetch(`/chat/${id}/messages`);
-    const messages = await res.json();
+    // Load the newest page of messages
+    const page = await fetchMessages(id);
+    if (id !== currentConversation) return;
+    const messages = page.messages;
+    oldestMessageId = messages.length ? messages[0].id : null;
+    hasOlderMessages = page.has_more;
 
     const container = document.getElementById("chat-messages");
     container.innerHTML = "";
@@ -76,12 +132,74 @@ async function loadConversation(id) {
 
         for (const msg of messages) {
             if (msg.role === "system") continue;
-            appendMessage(msg.role, msg.content);
+            appendMessage(msg.role, msg.content, msg.id, msg.complete);
         }
     }
 
     setInputEnabled(true);
-    document.getElementById("chat-input").focus();
+    if (messageId) {
+        showMessage(messageId);
+    } else {
+        document.getElementById("chat-input").focus();
+    }
+}
+
+// Scroll to a message (e.g. a search hit), loading older pages until it's there.
+async function showMessage(messageId) {
+    const id = currentConversation;
+    while (hasOlderMessages && oldestMessageId > messageId && id === currentConversation) {
+        await loadOlderMessages();
+    }
+    const el = document.querySelector(`#chat-messages .message[data-id="${messageId}"]`);
+    if (!el) return;
+    el.scrollIntoView({ block: "center" });
+    el.classList.add("message-highlight");
+    setTimeout(() => el.classList.remove("message-highlight"), 2000);
+}
+
+// ── Search ──
+let searchTimer = null;
+
+function searchConversations() {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(runSearch, 200);
+}
+
+async function runSearch() {
+    const q = document.getElementById("chat-search").value.trim();
+    const results = document.getElementById("chat-search-results");
+    const list = document.getElementById("chat-list");
+    if (!q) {
+        results.style.display = "none";
+        list.style.display = "";
+        return;
+    }
+
+    const res = await fetch(`/chat/search?q=${encodeURIComponent(q)}`);
+    const data = await res.json();
+    if (document.getElementById("chat-search").value.trim() !== q) return;  // stale
+
+    // Titles and snippets arrive HTML-escaped, with matches wrapped in <mark>.
+    results.innerHTML = "";
+    for (const t of data.titles) {
+        const item = document.createElement("div");
+        item.className = "chat-list-item chat-search-result";
+        item.innerHTML = `<span class="chat-title">${t.title}</span>`;
+        item.onclick = () => loadConversation(t.conversation_id);
+        results.appendChild(item);
+    }
+    for (const m of data.messages) {
+        const item = document.createElement("div");
+        item.className = "chat-list-item chat-search-result";
+        item.innerHTML = `<div><div class="chat-title">${m.title}</div><div class="snippet">${m.snippet}</div></div>`;
+        item.onclick = () => loadConversation(m.conversation_id, m.message_id);
+        results.appendChild(item);
+    }
+    if (!results.children.length) {
+        results.innerHTML = `<div class="text-dim text-sm">No matches.</div>`;
+    }
+    results.style.display = "";
+    list.style.display = "none";
 }
 
 async function sendMessage() {
@@ -107,19 +225,29 @@ async function sendMessage() {
             body: JSON.stringify({ message })
         });
 
+        if (!res.ok) {
+            // Plain JSON errors: no student selected, model queue full, ...
+            const data = await res.json().catch(() => ({}));
+            assistantDiv.textContent = data.error || "Something went wrong. Please try again.";
+            return;
+        }
+
         const reader = res.body.getReader();
         const decoder = new TextDecoder();
+        let buffer = "";
 
         while (true) {
             const { done, value } = await reader.read();
             if (done) break;
 
-            const text = decoder.decode(value);
-            const lines = text.split("\n");
+            // Frames can be split across reads; keep the incomplete tail.
+            buffer += decoder.decode(value, { stream: true });
+            const frames = buffer.split("\n\n");
+            buffer = frames.pop();
 
-            for (const line of lines) {
-                if (!line.startsWith("data: ")) continue;
-                const payload = line.slice(6).trim();
+            for (const frame of frames) {
+                if (!frame.startsWith("data: ")) continue;
+                const payload = frame.slice(6).trim();
 
                 if (payload === "[DONE]") continue;
 
@@ -142,17 +270,17 @@ async function sendMessage() {
                         assistantDiv.textContent = fullText;
                     }
                 } catch (e) {
-                    // Skip unparseable lines
+                    // Skip unparseable frames
                 }
             }
         }
     } catch (err) {
         assistantDiv.textContent = "Failed to connect. Is Ollama running?";
+    } finally {
+        isStreaming = false;
+        setInputEnabled(true);
+        document.getElementById("chat-input").focus();
     }
-
-    isStreaming = false;
-    setInputEnabled(true);
-    document.getElementById("chat-input").focus();
 }
 
 async function deleteConversation(id) {
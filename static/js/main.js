@@ -47,3 +47,50 @@ function showFlash(message, type = "success") {
     document.body.appendChild(flash);
     setTimeout(() => flash.remove(), 3000);
 }
+
+// Background jobs: follow a job's progress events over SSE. The job id is kept
+// in localStorage under storageKey so a reloaded page can pick it back up.
+function followJob(jobId, storageKey, handlers) {
+    localStorage.setItem(storageKey, jobId);
+    const source = new EventSource(`/jobs/${jobId}/events`);
+    source.onmessage = (e) => {
+        const data = JSON.parse(e.data);
+        if (data.event !== "status") {
+            if (handlers.onProgress) handlers.onProgress(data);
+            return;
+        }
+        source.close();
+        localStorage.removeItem(storageKey);
+        if (data.status === "done") handlers.onDone(data.result);
+        else handlers.onError(data.status === "cancelled" ? "Cancelled." : (data.error || "Something went wrong."));
+    };
+    source.onerror = () => {
+        // EventSource reconnects on its own; it only gives up if the job is gone.
+        if (source.readyState === EventSource.CLOSED) {
+            localStorage.removeItem(storageKey);
+            handlers.onError("Lost track of the background job.");
+        }
+    };
+    return source;
+}
+
+// Resume a job left running by an earlier page load, if there is one.
+function resumeJob(storageKey, handlers) {
+    const jobId = localStorage.getItem(storageKey);
+    if (!jobId) return;
+    fetch(`/jobs/${jobId}`)
+        .then(r => r.ok ? r.json() : null)
+        .then(job => {
+            if (!job) {
+                localStorage.removeItem(storageKey);
+                return;
+            }
+            if (handlers.onResume) handlers.onResume(job);
+            followJob(jobId, storageKey, handlers);
+        });
+}
+
+function cancelJob(storageKey) {
+    const jobId = localStorage.getItem(storageKey);
+    if (jobId) fetch(`/jobs/${jobId}/cancel`, { method: "POST" });
+}
@@ -1,5 +1,12 @@
+// Edits are collected per application and sent together in one PATCH, a
+// short while after the last change, when the edited field loses focus, or
+// as soon as the page is hidden.
+const FLUSH_DELAY_MS = 800;
+const pendingUpdates = new Map(); // application id -> {field: value}
+let flushTimer = null;
+
 function updateApp(el) {
-    const id = el.dataset.id;
+    const id = Number(el.dataset.id);
     const field = el.dataset.field;
     let value;
 
@@ -9,15 +16,55 @@ function updateApp(el) {
         value = el.value;
     }
 
-    fetch(`/tracker/update/${id}`, {
-        method: "POST",
+    pendingUpdates.set(id, { ...pendingUpdates.get(id), [field]: value });
+    clearTimeout(flushTimer);
+    flushTimer = setTimeout(flushUpdates, FLUSH_DELAY_MS);
+}
+
+function flushUpdates() {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+    if (!pendingUpdates.size) return;
+    const updates = [...pendingUpdates].map(([id, changes]) => ({ id, ...changes }));
+    pendingUpdates.clear();
+
+    // keepalive lets the request finish even if the page is being unloaded.
+    fetch("/tracker/applications", {
+        method: "PATCH",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ [field]: value })
-    });
+        body: JSON.stringify({ updates }),
+        keepalive: true
+    })
+        .then(r => r.json())
+        .then(data => {
+            const failed = (data.results || []).filter(r => !r.ok);
+            if (data.error || failed.length) {
+                showFlash(data.error || `Couldn't save ${failed.length} change${failed.length !== 1 ? "s" : ""}: ${failed[0].error}`, "warning");
+            }
+        })
+        .catch(() => {
+            // Put the changes back (newer edits win) and try again shortly.
+            for (const { id, ...changes } of updates) {
+                pendingUpdates.set(id, { ...changes, ...pendingUpdates.get(id) });
+            }
+            if (!flushTimer) flushTimer = setTimeout(flushUpdates, 5000);
+        });
 }
 
+// A field's change event fires before it loses focus, so its edit is queued by now.
+document.addEventListener("focusout", (e) => {
+    if (e.target.dataset && e.target.dataset.field && pendingUpdates.has(Number(e.target.dataset.id))) {
+        flushUpdates();
+    }
+});
+window.addEventListener("pagehide", flushUpdates);
+document.addEventListener("visibilitychange", () => {
+    if (document.visibilityState === "hidden") flushUpdates();
+});
+
 function deleteApp(id) {
     if (!confirm("Remove this application?")) return;
+    pendingUpdates.delete(id);
     fetch(`/tracker/delete/${id}`, { method: "POST" })
         .then(() => {
             const row = document.getElementById(`app-${id}`);
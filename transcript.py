@@ -1,6 +1,14 @@
+import hashlib
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import ollama
 
+import health
+import metrics
+import scheduler
+
 MODEL = "llama3.1:8b"
 
 PARSE_PROMPT = """You are a transcript parser. Extract every course from the transcript text below into a JSON array.
@@ -24,57 +32,397 @@ Rules:
 Respond with ONLY a valid JSON array. No markdown, no explanation."""
 
 
-def extract_text_pdf(file_path):
-    """Extract text from a PDF file using pdfplumber."""
+# Bump when PARSE_PROMPT or the post-processing changes, to invalidate cached parses.
+PARSE_PROMPT_VERSION = 4
+
+# Pages are joined with a form feed so later stages can split on page boundaries.
+PAGE_BREAK = "\f"
+
+# Leftover lines are sent to the model in chunks of about this many characters,
+# parsed concurrently on a shared, bounded pool.
+CHUNK_CHARS = 3000
+PARSE_WORKERS = 4
+
+_parse_pool = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="transcript-parse")
+
+VALID_GRADES = {"A+", "A", "A-", "B+", "B", "B-", "C+", "C", "C-", "D+", "D", "D-", "F"}
+VALID_YEARS = {"Freshman", "Sophomore", "Junior", "Senior"}
+VALID_TYPES = {"Regular", "Honors", "AP", "IB", "Dual Enrollment"}
+
+
+def file_digest(stream, chunk_size=64 * 1024):
+    """SHA-256 of a binary stream, read in chunks; rewinds the stream afterwards."""
+    h = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        h.update(chunk)
+    stream.seek(0)
+    return h.hexdigest()
+
+
+def normalize_text(raw_text):
+    """Collapse whitespace and drop blank lines so cosmetic differences hash the same."""
+    lines = (" ".join(line.split()) for line in raw_text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def parse_cache_key(raw_text):
+    """Cache key for the courses iter_parse() finds in this text."""
+    payload = json.dumps([MODEL, PARSE_PROMPT_VERSION, normalize_text(raw_text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def iter_pages_pdf(source):
+    """Yield the text of each PDF page, releasing each page's objects once read.
+
+    source may be a path or a binary file object.
+    """
     import pdfplumber
 
-    text_parts = []
-    with pdfplumber.open(file_path) as pdf:
+    with pdfplumber.open(source) as pdf:
         for page in pdf.pages:
             page_text = page.extract_text()
+            page.close()
             if page_text:
-                text_parts.append(page_text)
-    return "\n".join(text_parts)
+                yield page_text
+
+
+def extract_text_pdf(file_path):
+    """Extract text from a PDF file using pdfplumber."""
+    return PAGE_BREAK.join(iter_pages_pdf(file_path))
 
 
 def extract_text_docx(file_path):
-    """Extract text from a DOCX file using python-docx."""
+    """Extract text from a DOCX file using python-docx.
+
+    Paragraphs and table rows are emitted in document order so section
+    headers (e.g. "Grade 10") stay next to the rows they label.
+    """
     import docx
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
 
     doc = docx.Document(file_path)
     text_parts = []
-    for para in doc.paragraphs:
-        if para.text.strip():
-            text_parts.append(para.text)
-    # Also extract text from tables
-    for table in doc.tables:
-        for row in table.rows:
-            row_text = "\t".join(cell.text.strip() for cell in row.cells if cell.text.strip())
-            if row_text:
-                text_parts.append(row_text)
+    for child in doc.element.body.iterchildren():
+        if child.tag.endswith("}p"):
+            para = Paragraph(child, doc)
+            if para.text.strip():
+                text_parts.append(para.text)
+        elif child.tag.endswith("}tbl"):
+            for row in Table(child, doc).rows:
+                row_text = "\t".join(cell.text.strip() for cell in row.cells if cell.text.strip())
+                if row_text:
+                    text_parts.append(row_text)
     return "\n".join(text_parts)
 
 
-def extract_text(file_path, filename):
-    """Extract text from a file based on its extension."""
+def iter_pages(source, filename):
+    """Yield page texts from a path or binary file object, based on the file's extension."""
     ext = filename.rsplit(".", 1)[-1].lower()
     if ext == "pdf":
-        return extract_text_pdf(file_path)
+        yield from iter_pages_pdf(source)
     elif ext in ("docx", "doc"):
-        return extract_text_docx(file_path)
+        # DOCX has no fixed pages; grade-level headers still split it into sections.
+        text = extract_text_docx(source)
+        if text:
+            yield text
     else:
         raise ValueError(f"Unsupported file type: .{ext}")
 
 
+def extract_text(file_path, filename):
+    """Extract text from a file based on its extension."""
+    return PAGE_BREAK.join(iter_pages(file_path, filename))
+
+
+# ── Rule-based fast path ─────────────────────────────────────────
+#
+# Most transcripts are regular tables: a course name followed by a letter or
+# percentage grade and optional credits, grouped under grade-level headers.
+# Those rows are parsed here with the same rules PARSE_PROMPT gives the model;
+# only lines that look like courses but don't fit go to the LLM.
+
+YEAR_BY_LEVEL = {"9": "Freshman", "10": "Sophomore", "11": "Junior", "12": "Senior"}
+
+# A header is the whole line ("Grade 10", "11th Grade:", "Junior Year
+# (2024-2025)"), so rows such as "Senior Seminar A" are left to parse_row().
+_LEVEL_HEADER = re.compile(
+    r"^\s*(?:grade\s*(9|10|11|12)|(9|10|11|12)(?:th)?\s*grade|(freshman|sophomore|junior|senior))"
+    r"(?:\s+year)?\s*(?:[-:]?\s*\(?\d{4}\s*[-/]\s*\d{2,4}\)?)?\s*:?\s*$",
+    re.IGNORECASE,
+)
+# Side-by-side columns put several levels on one line ("Grade 9   Grade 10").
+# Their rows can't be assigned a year by line, so they go to the model.
+_LEVEL_COLUMNS = re.compile(
+    r"^\s*(?:(?:grade\s*(?:9|10|11|12)|(?:9|10|11|12)(?:th)?\s*grade|freshman|sophomore|junior|senior)"
+    r"(?:\s+year)?\s*:?\s*){2,}$",
+    re.IGNORECASE,
+)
+_LETTER_GRADE = re.compile(r"^[A-DF][+-]?$")
+_PERCENT_GRADE = re.compile(r"^(\d{1,3}(?:\.\d+)?)%?$")
+_CREDITS = re.compile(r"^\d(?:\.\d{1,2})?$")
+_GRADE_LIKE = re.compile(r"(?:^|\s)(?:[A-DF][+-]?|\d{2,3}(?:\.\d+)?%?|P|NP|Pass|Fail|CR|NC)(?:\s|$)")
+_NOT_A_COURSE = re.compile(
+    r"\b(?:gpa|cumulative|total|credits?\s+earned|class\s+rank|weighted|unweighted)\b",
+    re.IGNORECASE,
+)
+
+_TYPE_RULES = (
+    ("AP", re.compile(r"\bAP\b|advanced placement", re.IGNORECASE)),
+    ("IB", re.compile(r"\bIB\b|international baccalaureate", re.IGNORECASE)),
+    ("Honors", re.compile(r"\bhonors\b|\bhon\b\.?|\(H\)", re.IGNORECASE)),
+    ("Dual Enrollment", re.compile(r"dual enrollment|\bDE\b|^college\b", re.IGNORECASE)),
+)
+
+
+def course_type_for(name):
+    for ctype, pattern in _TYPE_RULES:
+        if pattern.search(name):
+            return ctype
+    return "Regular"
+
+
+def letter_for_percent(pct):
+    if pct >= 90:
+        return "A"
+    if pct >= 80:
+        return "B"
+    if pct >= 70:
+        return "C"
+    if pct >= 60:
+        return "D"
+    return "F"
+
+
+def _grade_from_token(token):
+    if _LETTER_GRADE.match(token):
+        return token
+    m = _PERCENT_GRADE.match(token)
+    if m and (token.endswith("%") or len(m.group(1).split(".")[0]) >= 2):
+        pct = float(m.group(1))
+        if 0 <= pct <= 100:
+            return letter_for_percent(pct)
+    return None
+
+
+def year_for_header(line):
+    """Grade level named by a section header line, or None.
+
+    >>> [year_for_header(h) for h in ("Grade 10", "11th grade:", "Senior Year (2025-2026)")]
+    ['Sophomore', 'Junior', 'Senior']
+    >>> [year_for_header(r) for r in ("Senior Seminar A", "Junior Achievement A", "Grade 10 Biology A")]
+    [None, None, None]
+    """
+    m = _LEVEL_HEADER.match(line)
+    if not m:
+        return None
+    level, level_alt, word = m.groups()
+    if word:
+        return word.capitalize()
+    return YEAR_BY_LEVEL[level or level_alt]
+
+
+def parse_row(line, year):
+    """Parse "<name> <grade> [credits]" into a course dict, or None.
+
+    A name holding its own grade and credits is two courses side by side,
+    which is left for the model rather than read as one.
+
+    >>> parse_row("English 9 A 1.0 English 10 B+ 1.0", "Freshman") is None
+    True
+    """
+    tokens = line.split()
+    credits = 1.0
+    if len(tokens) >= 3 and _CREDITS.match(tokens[-1]) and float(tokens[-1]) <= 2:
+        credits = float(tokens[-1])
+        tokens = tokens[:-1]
+    if len(tokens) < 2:
+        return None
+    grade = _grade_from_token(tokens[-1])
+    name = " ".join(tokens[:-1]).strip(" -:|")
+    if grade is None or not re.search(r"[A-Za-z]{2}", name) or _NOT_A_COURSE.search(name):
+        return None
+    if any(_grade_from_token(t) and _CREDITS.match(n) for t, n in zip(tokens[:-2], tokens[1:-1])):
+        return None
+    return {
+        "name": name,
+        "grade": grade,
+        "year": year or "Junior",
+        "course_type": course_type_for(name),
+        "credits": credits,
+        "source": "rules",
+    }
+
+
+def parse_page(page_no, page_text, year=None):
+    """Parse recognizable table rows on one page.
+
+    year is the grade level in effect from earlier pages. Returns
+    (courses, leftover, year) where leftover is a list of (page, year, line)
+    for lines that look like they hold a grade but didn't match a row
+    pattern (including pass/fail rows, which have no letter grade, and
+    side-by-side columns). Headers, blank lines and summary lines are
+    dropped, except multi-column headers, which are kept with their rows so
+    the model can tell the columns apart.
+
+    >>> courses, _, year = parse_page(0, "Junior Year\\nSenior English B+ 1.0\\nChemistry A")
+    >>> [(c["name"], c["year"]) for c in courses], year
+    ([('Senior English', 'Junior'), ('Chemistry', 'Junior')], 'Junior')
+    >>> courses, leftover, _ = parse_page(0, "Grade 9 Grade 10\\nEnglish 9 A 1.0 English 10 B+ 1.0\\n"
+    ...                                      "Physical Education P 0.5")
+    >>> courses, [line for _, _, line in leftover]
+    ([], ['Grade 9 Grade 10', 'English 9 A 1.0 English 10 B+ 1.0', 'Physical Education P 0.5'])
+    """
+    courses = []
+    leftover = []
+    for line in page_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        header_year = year_for_header(line)
+        if header_year:
+            year = header_year
+            continue
+        if _LEVEL_COLUMNS.match(line):
+            year = None
+            leftover.append((page_no, year, line))
+            continue
+        course = parse_row(line, year)
+        if course:
+            courses.append(course)
+        elif _GRADE_LIKE.search(line) and not _NOT_A_COURSE.search(line):
+            leftover.append((page_no, year, line))
+    return courses, leftover, year
+
+
+class _LeftoverChunks:
+    """Groups leftover lines into model-sized chunks as they arrive,
+    preferring page and grade-level boundaries."""
+
+    def __init__(self, max_chars=CHUNK_CHARS):
+        self.max_chars = max_chars
+        self.current, self.size, self.section = [], 0, None
+
+    def add(self, item):
+        """Add a (page, year, line); returns the chunk it closed, or None.
+
+        item starts a new chunk when the current one would overflow, or is
+        half full and item begins a new page or grade-level section.
+        """
+        page, year, line = item
+        closed = None
+        if self.size > 0 and (
+            self.size + len(line) > self.max_chars
+            or ((page, year) != self.section and self.size >= self.max_chars // 2)
+        ):
+            closed, self.current, self.size = self.current, [], 0
+        self.current.append(item)
+        self.size += len(line) + 1
+        self.section = (page, year)
+        return closed
+
+    def flush(self):
+        """The last, partly filled chunk, or None."""
+        closed, self.current, self.size = self.current, [], 0
+        return closed or None
+
+
+def _leftover_text(leftover):
+    """Render leftover lines for the model, restoring their grade-level headers."""
+    parts = []
+    current = object()
+    for _page, year, line in leftover:
+        if year != current:
+            parts.append(f"{year} year:" if year else "Grade level unknown:")
+            current = year
+        parts.append(line)
+    return "\n".join(parts)
+
+
+def merge_courses(rule_courses, *model_groups):
+    """Rule-parsed courses plus the model's, minus model courses that repeat a
+    rule-parsed name and year. Repeated rows within either source are kept.
+
+    >>> spanish = {"name": "Spanish II", "year": "Junior"}
+    >>> len(merge_courses([spanish, spanish], [{"name": "spanish  ii", "year": "Junior"}]))
+    2
+    """
+    seen = {(" ".join(c["name"].split()).lower(), c["year"]) for c in rule_courses}
+    merged = list(rule_courses)
+    for group in model_groups:
+        merged += [c for c in group if (" ".join(c["name"].split()).lower(), c["year"]) not in seen]
+    return merged
+
+
+def iter_parse(pages):
+    """Parse an iterable of page texts as it is produced, yielding progress events.
+
+    Rows are parsed as each page arrives, and every chunk of leftover lines
+    is handed to the model pool as soon as it is complete, so inference
+    overlaps with extraction of later pages. Yields
+    {"event": "page", ...} per page, {"event": "chunk", ...} as model chunks
+    finish, and finally {"event": "done", "courses": [...], "failed_chunks": n}
+    where n counts model chunks that raised; their lines are missing from
+    courses.
+    """
+    courses = []
+    futures = []
+    chunks = _LeftoverChunks(CHUNK_CHARS)
+    year = None
+    page_no = -1
+    for page_no, page_text in enumerate(pages):
+        page_courses, leftover, year = parse_page(page_no, page_text, year)
+        courses += page_courses
+        for item in leftover:
+            chunk = chunks.add(item)
+            if chunk:
+                futures.append(_parse_pool.submit(parse_with_llm, _leftover_text(chunk)))
+        yield {"event": "page", "page": page_no + 1, "courses": len(courses), "chunks": len(futures)}
+    chunk = chunks.flush()
+    if chunk:
+        futures.append(_parse_pool.submit(parse_with_llm, _leftover_text(chunk)))
+
+    errors = []
+    for done, future in enumerate(as_completed(futures), 1):
+        try:
+            future.result()
+        except Exception as e:
+            errors.append(e)
+        yield {"event": "chunk", "done": done, "total": len(futures)}
+
+    results = [f.result() for f in futures if f.exception() is None]
+    # A bad chunk shouldn't sink the rest, but a total failure should surface.
+    if errors and not results and not courses:
+        raise errors[0]
+    yield {"event": "done", "pages": page_no + 1, "courses": merge_courses(courses, *results),
+           "failed_chunks": len(errors)}
+
+
 def parse_transcript(raw_text):
-    """Send extracted text to Ollama and parse into structured course data."""
-    response = ollama.chat(
-        model=MODEL,
-        messages=[
-            {"role": "system", "content": PARSE_PROMPT},
-            {"role": "user", "content": f"Transcript text:\n\n{raw_text}"},
-        ],
-    )
+    """Parse a transcript into course dicts, tagged with the "source" that produced them.
+
+    Regular table rows are handled by the rule-based parser; the model only
+    sees the lines it could not read, and isn't called at all when there are
+    none. Long leftovers are split into chunks parsed concurrently, so latency
+    tracks the slowest chunk rather than the whole document.
+    """
+    for event in iter_parse(raw_text.split(PAGE_BREAK)):
+        if event["event"] == "done":
+            return event["courses"]
+    return []
+
+
+def parse_with_llm(raw_text):
+    """Send transcript text to Ollama and parse into structured course data."""
+    with health.guard(), scheduler.slot("parse"), metrics.llm_span("parse") as span:
+        response = ollama.chat(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": PARSE_PROMPT},
+                {"role": "user", "content": f"Transcript text:\n\n{raw_text}"},
+            ],
+        )
+        span.finish(response)
 
     text = response["message"]["content"].strip()
 
@@ -90,27 +438,25 @@ def parse_transcript(raw_text):
     courses = json.loads(text)
 
     # Validate and normalize
-    valid_grades = {"A+", "A", "A-", "B+", "B", "B-", "C+", "C", "C-", "D+", "D", "D-", "F"}
-    valid_years = {"Freshman", "Sophomore", "Junior", "Senior"}
-    valid_types = {"Regular", "Honors", "AP", "IB", "Dual Enrollment"}
-
     cleaned = []
     for c in courses:
         if not isinstance(c, dict) or "name" not in c:
             continue
         grade = c.get("grade", "B")
-        if grade not in valid_grades:
+        if grade not in VALID_GRADES:
             grade = "B"
         year = c.get("year", "Junior")
-        if year not in valid_years:
+        if year not in VALID_YEARS:
             year = "Junior"
         ctype = c.get("course_type", "Regular")
-        if ctype not in valid_types:
+        if ctype not in VALID_TYPES:
             ctype = "Regular"
         try:
             credits = float(c.get("credits", 1.0))
         except (ValueError, TypeError):
             credits = 1.0
+        if not 0.5 <= credits <= 2.0:  # the range the import accepts
+            credits = 1.0
 
         cleaned.append({
             "name": str(c["name"]).strip(),
@@ -118,6 +464,7 @@ def parse_transcript(raw_text):
             "year": year,
             "course_type": ctype,
             "credits": credits,
+            "source": "llm",
         })
 
     return cleaned